@@ -1,25 +1,37 @@
 #!/usr/bin/env python3
 
+import argparse
+import bisect
+import contextlib
 import os
+import re
+import subprocess
 import sys
+from datetime import datetime, timedelta
 from pathlib import Path
 
 import urwid
 
 import yaml
 
+from offsplit import CLOCKS, Archive, Profiler, ValidationError, Validator, get_run_duration, load_yaml
+
 
 def get_time_str(ts):
-    hours = int(abs(ts) / 3600)
-    minutes = int(abs(ts / 60) % 60)
-    seconds = int(abs(ts) % 60)
+    """
+    Format a time expressed in integer milliseconds.
+    """
+    ts = abs(ts)
+    hours = ts // 3600000
+    minutes = ts // 60000 % 60
+    seconds = ts // 1000 % 60
 
     if hours:
         return '%dh %02dm %02ds' % (hours, minutes, seconds)
     if minutes:
         return '%dm %02ds' % (minutes, seconds)
 
-    return '%ds' % abs(ts)
+    return '%ds' % seconds
 
 
 class Route(urwid.WidgetWrap):
@@ -27,7 +39,8 @@ class Route(urwid.WidgetWrap):
         self.path = path
 
         with open(path, 'r', encoding='utf-8') as fp:
-            self.route = yaml.safe_load(fp)
+            self.route, lines = load_yaml(path, fp)
+        Validator(path, lines).route(self.route)
 
         self.game = self.route['game']
         self.name = self.route['name']
@@ -50,25 +63,361 @@ class Route(urwid.WidgetWrap):
         self.text_widget.set_text(text)
 
 
-class Run(urwid.WidgetWrap):
-    def __init__(self, path):
-        self.path = path
-        self.name = path.stem
+def git(*args):
+    """
+    Run a git command and return its output, or None if it fails.
+    """
+    try:
+        return subprocess.run(['git', *args], capture_output=True, check=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
 
-        with open(path, 'r', encoding='utf-8') as fp:
-            self.run = yaml.safe_load(fp)
 
-        self.duration = 0.0
+def read_run(path):
+    """
+    Read the summary of a run file, as stored in the :class:`RunIndex`.
+
+    :raises ValidationError: if the file is malformed
+    """
+    with open(path, 'r', encoding='utf-8') as fp:
+        run, lines = load_yaml(path, fp)
+    Validator(path, lines).run(run)
+
+    return {
+        'route': run['route'],
+        'updated': run['updated'],
+        'duration': get_run_duration(run),
+        'game_duration': get_run_duration(run, 'game'),
+    }
+
+
+class RunIndex:
+    """
+    Summary of every run in RUNS_DIR, kept up to date incrementally.
+
+    When RUNS_DIR is in a git repository, only the files changed since the
+    last indexed commit (``git diff --name-status``) and the uncommitted
+    files are read again. Otherwise, the whole tree is scanned. Paths are
+    relative to the current directory, like RUNS_DIR, even when it is not
+    the root of the repository.
+
+    Archived runs are read from the index of their archive, and are indexed
+    as ``<archive index>/<name>.yml``.
+
+    Malformed files are skipped, and their error is kept until they change.
+    """
+    RUNS_DIR = 'runs'
+    PATH = '.leaderboard.yml'
+
+    def __init__(self):
+        self.commit = None
+        self.runs = {}
+        # Uncommitted files of the last update, to read again in case they
+        # have been reverted since.
+        self.dirty = set()
+        self.errors = {}
+
+    @classmethod
+    def load(cls):
+        index = cls()
         try:
-            segments = self.run['segs'].values()
-        except KeyError:
-            segments = self.run['run']
+            with open(cls.PATH, 'r', encoding='utf-8') as fp:
+                d = yaml.load(fp, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+        except FileNotFoundError:
+            return index
+
+        index.commit = d['commit']
+        index.runs = d['runs']
+        index.dirty = set(d['dirty'])
+        index.errors = d.get('errors', {})
+        return index
+
+    def save(self):
+        with open(self.PATH, 'w', encoding='utf-8') as fp:
+            yaml.dump(
+                {'commit': self.commit, 'runs': self.runs, 'dirty': sorted(self.dirty), 'errors': self.errors},
+                fp,
+                Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper),
+            )
+
+    def add(self, path):
+        if not path.startswith(self.RUNS_DIR + '/'):
+            return
+
+        if Path(path).name == Archive.INDEX:
+            self.add_archive(path)
+            return
+
+        if not path.endswith('.yml') or Path(path).name == 'pb.yml':
+            return
+
+        self.remove(path)
+        try:
+            self.runs[path] = read_run(path)
+        except FileNotFoundError:
+            pass
+        except ValidationError as e:
+            self.errors[path] = str(e)
+
+    def add_archive(self, path):
+        self.remove(path)
+        for run in Archive(Path(path).parent).load_index():
+            self.runs[f'{path}/{run["name"]}.yml'] = {
+                'route': run['route'],
+                'updated': run['updated'],
+                'duration': run['duration'],
+                'game_duration': run.get('game_duration', run['duration']),
+            }
+
+    def remove(self, path):
+        self.runs.pop(path, None)
+        self.errors.pop(path, None)
+        if Path(path).name == Archive.INDEX:
+            prefix = path + '/'
+            for key in [key for key in self.runs if key.startswith(prefix)]:
+                del self.runs[key]
+
+    def scan(self):
+        self.runs = {}
+        self.errors = {}
+        for root, _, files in os.walk(self.RUNS_DIR):
+            for name in files:
+                self.add(str(Path(root) / name))
+
+    def update(self):
+        head = git('rev-parse', '--verify', '-q', 'HEAD')
+        if head is None:
+            self.commit = None
+            self.dirty = set()
+            self.scan()
+            return
+
+        head = head.strip()
+        changes = None
+        if self.commit:
+            changes = git(
+                'diff', '--name-status', '-z', '--no-renames', '--relative', self.commit, head, '--', self.RUNS_DIR,
+            )
+
+        if changes is None:
+            # First update, or the indexed commit has been lost (rebase, …)
+            self.scan()
+        else:
+            fields = changes.split('\0')
+            for status, path in zip(fields[0::2], fields[1::2]):
+                if status == 'D':
+                    self.remove(path)
+                else:
+                    self.add(path)
+
+        # Unlike git diff and git ls-files, git status --porcelain prints
+        # paths relative to the root of the repository.
+        modified = git('diff', '--name-only', '-z', '--no-renames', '--relative', 'HEAD', '--', self.RUNS_DIR) or ''
+        untracked = git('ls-files', '-z', '--others', '--exclude-standard', '--', self.RUNS_DIR) or ''
+        dirty = {path for path in (modified + untracked).split('\0') if path}
+
+        for path in dirty | self.dirty:
+            self.add(path)
+
+        self.commit = head
+        self.dirty = dirty
+
+
+def sync(remote, branch=None):
+    """
+    Pull the runs of other players from a git remote, which can be a local
+    bare repository.
+
+    The current branch is only fast-forwarded: it fails if it has commits
+    which are not on the remote.
+    """
+    if git('fetch', remote, *([branch] if branch else [])) is None:
+        raise RuntimeError(f'Unable to fetch {remote}')
+
+    if git('merge', '--ff-only', 'FETCH_HEAD') is None:
+        raise RuntimeError(
+            f'Unable to fast-forward to {remote}, local history has diverged: push or rebase your commits first'
+        )
+
 
-        for seg in segments:
-            if seg['duration'] is None:
-                self.duration = None
+def parse_duration(text):
+    """
+    Parse a duration in milliseconds, as ``1:23:45``, ``83:45``, ``1h23m45s``
+    or a number of minutes.
+
+    :raises ValueError: if it is not a duration
+    """
+    if ':' in text:
+        total = 0
+        for part in text.split(':'):
+            if not part.isdigit():
+                raise ValueError(f'invalid time {text!r}')
+            total = total * 60 + int(part)
+        return total * 1000
+
+    if text.isdigit():
+        return int(text) * 60000
+
+    match = re.fullmatch(r'(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?', text)
+    if not text or not match:
+        raise ValueError(f'invalid time {text!r}')
+
+    hours, minutes, seconds = (int(value or 0) for value in match.groups())
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000
+
+
+def parse_date_range(text):
+    """
+    Parse ``DATE``, ``DATE..DATE``, ``DATE..`` or ``..DATE``, where a date is
+    ``YYYY``, ``YYYY-MM`` or ``YYYY-MM-DD``, as a ``[start, end)`` range of
+    datetimes.
+
+    :raises ValueError: if it is not a date range
+    """
+    def parse(date, end):
+        if not date:
+            return None
+
+        parts = [int(part) for part in date.split('-')]
+        start = datetime(*parts, *[1] * (3 - len(parts)))
+        if not end:
+            return start
+        if len(parts) == 1:
+            return start.replace(year=start.year + 1)
+        if len(parts) == 2:
+            return (start + timedelta(days=31)).replace(day=1)
+        return start + timedelta(days=1)
+
+    first, dots, last = text.partition('..')
+    if not dots:
+        last = first
+    return parse(first, False), parse(last, True)
+
+
+def get_duration(run, clock):
+    """
+    Duration of an indexed run. Runs indexed before game times existed only
+    have their real time, which is also their game time.
+    """
+    if clock == 'game':
+        return run.get('game_duration', run['duration'])
+
+    return run['duration']
+
+
+class SearchIndex:
+    """
+    In-memory index of the runs of a route, to filter them on each keystroke.
+
+    Player and run names are split in lowercase tokens, kept sorted so that a
+    prefix is a range of tokens, each one with the set of runs it appears in.
+    The runs of the shortest prefixes, which match most tokens, are indexed
+    too.
+    Durations are sorted by rank and dates are sorted once, so thresholds
+    and date ranges are bisections.
+
+    A query is made of space separated terms, which all have to match:
+
+    * ``WORD``: prefix of a word of the player or the run name
+    * ``player:WORD`` or ``name:WORD``: prefix of a word of that field only
+    * ``<TIME`` or ``>TIME``: runs faster or slower than TIME
+    * ``DATE``, ``DATE..DATE``: runs updated during a date range
+
+    :param runs: :class:`Run` widgets, sorted by rank
+    """
+    FIELDS = ('player', 'name')
+    # Length of the prefixes whose runs are indexed
+    SHORT_PREFIX = 2
+    DATE_RE = re.compile(r'(\d{4}(-\d{1,2}){0,2})?(\.\.(\d{4}(-\d{1,2}){0,2})?)?')
+
+    def __init__(self, runs):
+        self.size = len(runs)
+        self.durations = [run.duration for run in runs]
+        self.by_date = sorted(range(self.size), key=lambda pos: runs[pos].run['updated'])
+        self.dates = [runs[pos].run['updated'] for pos in self.by_date]
+
+        self.postings = {field: {} for field in self.FIELDS}
+        self.prefixes = {field: {} for field in self.FIELDS}
+        for pos, run in enumerate(runs):
+            for field, value in zip(self.FIELDS, (run.who, run.name)):
+                tokens = self.get_tokens(value)
+                for token in tokens:
+                    self.postings[field].setdefault(token, set()).add(pos)
+                for prefix in {token[:length] for token in tokens for length in range(1, self.SHORT_PREFIX + 1)}:
+                    self.prefixes[field].setdefault(prefix, set()).add(pos)
+        self.tokens = {field: sorted(postings) for field, postings in self.postings.items()}
+
+    @staticmethod
+    def get_tokens(value):
+        value = value.lower()
+        return {value, *re.split(r'[\W_]+', value)} - {''}
+
+    def lookup(self, field, prefix):
+        """
+        Runs with a token of *field* starting with *prefix*.
+        """
+        if len(prefix) <= self.SHORT_PREFIX:
+            return self.prefixes[field].get(prefix, set())
+
+        tokens = self.tokens[field]
+        result = set()
+        for idx in range(bisect.bisect_left(tokens, prefix), len(tokens)):
+            if not tokens[idx].startswith(prefix):
                 break
-            self.duration += seg['duration']
+            result |= self.postings[field][tokens[idx]]
+        return result
+
+    def match(self, term):
+        """
+        Runs matching a term of a query, as a set or a range of ranks.
+
+        :raises ValueError: if the term is malformed
+        """
+        if term[0] in '<>':
+            threshold = parse_duration(term[1:])
+            if term[0] == '<':
+                return range(bisect.bisect_left(self.durations, threshold))
+            return range(bisect.bisect_right(self.durations, threshold), self.size)
+
+        if term[0].isdigit() and self.DATE_RE.fullmatch(term) or term.startswith('..'):
+            start, end = parse_date_range(term)
+            lo = bisect.bisect_left(self.dates, start) if start else 0
+            hi = bisect.bisect_left(self.dates, end) if end else self.size
+            return set(self.by_date[lo:hi])
+
+        field, _, prefix = term.rpartition(':')
+        if field:
+            if field not in self.FIELDS:
+                raise ValueError(f'unknown field {field!r}')
+            return self.lookup(field, prefix)
+
+        return self.lookup('player', prefix) | self.lookup('name', prefix)
+
+    def search(self, query):
+        """
+        Ranks of the runs matching a query, in order.
+
+        :raises ValueError: if the query is malformed
+        """
+        result = None
+        for term in query.lower().split():
+            matches = self.match(term)
+            if result is None:
+                result = set(matches)
+            else:
+                result.intersection_update(matches)
+
+        if result is None:
+            return range(self.size)
+        return sorted(result)
+
+
+class Run(urwid.WidgetWrap):
+    def __init__(self, path, run, clock='real'):
+        self.path = path
+        self.name = path.stem
+        self.run = run
+        self.duration = get_duration(run, clock)
 
         self.who = path.parts[1]
         self.rank_widget = urwid.Text('', align='left')
@@ -117,6 +466,8 @@ class MainWindow(urwid.WidgetWrap):
         ('focus route name','dark blue',    'black',        '',       idle,      selection_bg),
         ('route game',      'light green',  'black',        '',       ahead_gain,default_bg),
         ('focus route game','light green',  'black',        '',       ahead_gain,selection_bg),
+        ('footer',          'yellow',       'dark blue',    '',       idle,      footer_bg),
+        ('footer error',    'dark red',     'dark blue',    '',       behind_loss, footer_bg),
     ]
     focus_map = {
         'route':         'focus route',
@@ -134,16 +485,23 @@ class MainWindow(urwid.WidgetWrap):
         self.routes_listbox = urwid.ListBox(self.routes)
         self.runs = urwid.SimpleListWalker([])
         self.runs_listbox = urwid.ListBox(self.runs)
+        self.time_head = urwid.Text('Time')
         self.table_head = urwid.Columns(
             [
                 ('weight', 1, urwid.Padding(urwid.Text('#'), ('fixed left', 1))),
                 ('weight', 4, urwid.Text('Run name')),
                 ('weight', 4, urwid.Text('Player')),
-                ('weight', 4, urwid.Text('Time')),
+                ('weight', 4, self.time_head),
                 ('weight', 4, urwid.Text('Date')),
             ],
         )
-        self.view = urwid.Frame(
+        self.search = urwid.Edit('/')
+        self.count = urwid.Text('', align='right')
+        self.footer = urwid.AttrMap(urwid.Columns([
+            ('weight', 4, self.search),
+            ('weight', 1, self.count),
+        ]), 'footer')
+        self.frame = urwid.Frame(
             urwid.Columns(
                 [
                     ('weight', 1, urwid.AttrMap(self.routes_listbox, 'route')),
@@ -155,9 +513,10 @@ class MainWindow(urwid.WidgetWrap):
                 ],
                 dividechars=1
             ),
-            header=self.header
+            header=self.header,
+            footer=self.footer,
         )
-        self.view = urwid.AttrMap(self.view, None, 'focus')
+        self.view = urwid.AttrMap(self.frame, None, 'focus')
 
         super().__init__(self.view)
 
@@ -165,25 +524,87 @@ class MainWindow(urwid.WidgetWrap):
 class Leaderboard:
     def __init__(self):
         self.view = MainWindow(self)
+        self.index = None
+        self.clock = 'real'
+        # Run widgets of the selected route by rank, and their search index
+        self.run_widgets = []
+        self.search_index = None
+        self.profiler = None
         self.loop = urwid.MainLoop(self.view, self.view.palette, unhandled_input=self.unhandled_input)
         self.loop.screen.set_terminal_properties(colors=2**24)
+        urwid.connect_signal(self.view.search, 'postchange', lambda *args: self.filter())
 
     def main(self):
-        routes = []
-        for root, _, files in os.walk('routes'):
-            for name in files:
-                if not name.endswith('.yml'):
-                    continue
+        parser = argparse.ArgumentParser(description='Leaderboard of all runs.')
+        parser.add_argument(
+            '--sync', metavar='REMOTE',
+            help='first pull the runs of other players from a git remote (URL, name or path of a bare repository)'
+        )
+        parser.add_argument('--branch', help='branch to pull with --sync (default: remote HEAD)')
+        parser.add_argument(
+            '--clock', choices=CLOCKS, default='real',
+            help='rank runs by real time, or game time without loading screens (default: %(default)s)'
+        )
+        Profiler.add_arguments(parser, 'leaderboard.pstats')
+        args = parser.parse_args()
+
+        if args.sync:
+            try:
+                sync(args.sync, args.branch)
+            except RuntimeError as e:
+                print(e, file=sys.stderr)
+                return 1
+
+        self.clock = args.clock
+
+        if args.profile:
+            self.profiler = Profiler(args.profile, args.profile_memory)
+            self.profiler.start(self.loop)
+
+        errors = []
+        try:
+            with self.phase('load'):
+                routes = []
+                for root, _, files in os.walk('routes'):
+                    for name in files:
+                        if not name.endswith('.yml'):
+                            continue
+
+                        try:
+                            route = Route(Path(root) / name)
+                        except ValidationError as e:
+                            errors.append(str(e))
+                            continue
+                        routes.append(route)
+
+                for route in sorted(routes, key=lambda r: r.game + r.name):
+                    self.view.routes.append(urwid.AttrMap(route, 'route', 'focus route'))
+
+                self.index = RunIndex.load()
+
+                self.select()
+
+                errors += self.index.errors.values()
+                if errors:
+                    self.view.title.set_text(f'Leaderboard ({len(errors)} malformed files skipped)')
 
-                route = Route(Path(root) / name)
-                routes.append(route)
+            with self.phase('run'):
+                self.loop.run()
+        finally:
+            if self.profiler:
+                self.profiler.stop()
+                print(f'Profile saved in {self.profiler.path}', file=sys.stderr)
 
-        for route in sorted(routes, key=lambda r: r.game + r.name):
-            self.view.routes.append(urwid.AttrMap(route, 'route', 'focus route'))
+        for error in errors:
+            print(error, file=sys.stderr)
 
-        self.select()
+        return 0
 
-        self.loop.run()
+    def phase(self, name):
+        if not self.profiler:
+            return contextlib.nullcontext()
+
+        return self.profiler.phase(name)
 
     def select(self):
         route = None
@@ -194,27 +615,60 @@ class Leaderboard:
             else:
                 r.base_widget.set_selected(False)
 
-        self.view.runs.clear()
-        runs = []
-        for root, _, files in os.walk('runs'):
-            for name in files:
-                if not name.endswith('.yml') or name == 'pb.yml':
-                    continue
+        self.index.update()
+        self.index.save()
 
-                run = Run(Path(root) / name)
-                if run.run['route'] != str(route.path) or run.duration is None:
-                    continue
+        runs = []
+        for path, run in self.index.runs.items():
+            if run['route'] != str(route.path) or get_duration(run, self.clock) is None:
+                continue
 
-                runs.append(run)
+            runs.append(Run(Path(path), run, self.clock))
 
-        for rank, run in enumerate(sorted(runs, key=lambda r: r.duration)):
+        runs.sort(key=lambda r: r.duration)
+        self.view.time_head.set_text(f'{self.clock.capitalize()} time')
+        self.run_widgets = []
+        for rank, run in enumerate(runs):
             run.rank_widget.set_text(str(rank + 1))
-            self.view.runs.append(urwid.AttrMap(run, 'run%d' % (rank % 2)))
+            self.run_widgets.append(urwid.AttrMap(run, 'run%d' % (rank % 2)))
+
+        self.search_index = SearchIndex(runs)
+        self.filter()
+
+    def filter(self):
+        """
+        Show the runs matching the search, without creating widgets.
+        """
+        if self.search_index is None:
+            return
+
+        try:
+            ranks = self.search_index.search(self.view.search.edit_text)
+        except ValueError as e:
+            self.view.count.set_text(('footer error', str(e)))
+            return
+
+        self.view.runs[:] = [self.run_widgets[rank] for rank in ranks]
+        self.view.count.set_text(f'{len(ranks)}/{self.search_index.size} runs')
 
     def unhandled_input(self, k):
+        if self.view.frame.focus_position == 'footer':
+            if k == 'esc':
+                self.view.search.set_edit_text('')
+            if k in ('enter', 'esc'):
+                self.view.frame.focus_position = 'body'
+            return
+
         if k == 'q':
             raise urwid.ExitMainLoop()
 
+        if k == '/':
+            self.view.frame.focus_position = 'footer'
+
+        if k == 't':
+            self.clock = CLOCKS[1 - CLOCKS.index(self.clock)]
+            return self.select()
+
         if k == 'enter':
             return self.select()
 
@@ -1,10 +1,27 @@
 #!/usr/bin/env python3
 
+import argparse
+import array
+import asyncio
+import collections
 import colorsys
+import contextlib
+import cProfile
+import gzip
+import hashlib
+import json
+import marshal
+import math
 import os
+import queue
+import random
+import socket
+import statistics
 import sys
+import threading
 import time
-from dataclasses import asdict, dataclass
+import tracemalloc
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
 from pathlib import Path
 
@@ -19,6 +36,86 @@ except ImportError:
         return text
 
 
+class Profiler:
+    """
+    Opt-in profiling of a session.
+
+    The whole session is captured with cProfile and dumped as a .pstats file
+    on exit, with a summary of the phases (time spent, memory allocated, and
+    bytes written to the terminal) next to it. If *memory_interval* is set, a
+    tracemalloc snapshot is also dumped every *memory_interval* seconds.
+
+    :param path: path of the .pstats file
+    :param memory_interval: seconds between tracemalloc snapshots
+    """
+
+    def __init__(self, path, memory_interval=None):
+        self.path = Path(path)
+        self.memory_interval = memory_interval
+        self.profile = cProfile.Profile()
+        self.phases = []
+        self.snapshots = 0
+        self.loop = None
+        # Bytes written to the terminal
+        self.output = 0
+
+    @staticmethod
+    def add_arguments(parser, default):
+        parser.add_argument(
+            '--profile', metavar='PATH', nargs='?', const=default,
+            help=f'profile the session and dump stats in PATH (default: {default})'
+        )
+        parser.add_argument(
+            '--profile-memory', metavar='SECONDS', type=float,
+            help='with --profile, also dump a tracemalloc snapshot every SECONDS'
+        )
+
+    def start(self, loop):
+        self.loop = loop
+        write = loop.screen.write
+
+        def count_output(data):
+            self.output += len(data.encode('utf-8', 'replace'))
+            return write(data)
+        loop.screen.write = count_output
+
+        if self.memory_interval:
+            tracemalloc.start()
+            self.loop.set_alarm_in(self.memory_interval, self.snapshot)
+
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+
+        with open(self.path.with_suffix('.phases.yml'), 'w', encoding='utf-8') as fp:
+            yaml.dump(self.phases, fp, sort_keys=False)
+
+    def snapshot(self, loop=None, user_data=None):
+        self.snapshots += 1
+        tracemalloc.take_snapshot().dump(str(self.path.with_suffix(f'.{self.snapshots}.snapshot')))
+        self.loop.set_alarm_in(self.memory_interval, self.snapshot)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Mark a phase of the session (for example load, run or save).
+        """
+        memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        output = self.output
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phase = {'name': name, 'seconds': time.perf_counter() - start}
+            phase['output'] = self.output - output
+            phase['output_rate'] = round(phase['output'] / phase['seconds']) if phase['seconds'] else 0
+            if memory is not None:
+                phase['allocated'] = tracemalloc.get_traced_memory()[0] - memory
+            self.phases.append(phase)
+
+
 def get_big_timer(progress):
     digits = [
         "00000111112222233333444445555566666777778888899999  !!::..",
@@ -45,17 +142,93 @@ def get_big_timer(progress):
     return display
 
 
+def to_ms(seconds):
+    """
+    Convert a legacy float duration in seconds to integer milliseconds.
+    """
+    if seconds is None:
+        return None
+
+    return int(round(seconds * 1000))
+
+
 def get_time_str(ts):
-    hours = int(abs(ts) / 3600)
-    minutes = int(abs(ts / 60) % 60)
-    seconds = int(abs(ts) % 60)
+    """
+    Format a time expressed in integer milliseconds.
+    """
+    ts = abs(ts)
+    hours = ts // 3600000
+    minutes = ts // 60000 % 60
+    seconds = ts // 1000 % 60
 
     if hours:
         return '%02d:%02d:%02d' % (hours, minutes, seconds)
     if minutes:
         return '%02d:%02d' % (minutes, seconds)
 
-    return '%.1f' % abs(ts)
+    return '%d.%d' % (seconds, ts // 100 % 10)
+
+
+# Real time always runs (unless the run is paused), game time does not
+# include loading screens.
+CLOCKS = ('real', 'game')
+
+
+def get_seg_key(key, clock):
+    """
+    Key of a segment time ('duration', 'pb' or 'gold') in a run file.
+    """
+    return f'game_{key}' if clock == 'game' else key
+
+
+def get_seg_time(seg, key, clock='real'):
+    """
+    Time of a segment in a run file. Runs without game times, for example
+    saved before they existed, have the same game and real times.
+    """
+    return seg.get(get_seg_key(key, clock), seg.get(key))
+
+
+def get_run_duration(d, clock='real'):
+    """
+    Total duration in milliseconds of the content of a run file, or None if
+    the run is not finished.
+    """
+    try:
+        segments = d['segs'].values()
+    except KeyError:
+        segments = d['run']
+
+    # Version 1 runs store durations as float seconds.
+    legacy = d.get('version', 1) < 2
+    duration = 0
+    for seg in segments:
+        seg_duration = get_seg_time(seg, 'duration', clock)
+        if seg_duration is None:
+            return None
+        duration += to_ms(seg_duration) if legacy else seg_duration
+
+    return duration
+
+
+def get_description_markup(build, description):
+    """
+    Markup of a segment description, where parts between '|' are highlighted.
+    """
+    text = []
+    for b in build:
+        text.append(('build', b + '\n'))
+
+    color = 'normal'
+    for part in description.split('|'):
+        text.append((color, part))
+        color = 'hilight' if color == 'normal' else 'normal'
+
+    return tuple(text)
+
+
+def get_stats_text(stats):
+    return '\n'.join(f'{key} {value}' for key, value in stats.items())
 
 
 def get_timer_display(progress, color='normal', sign=False):
@@ -69,6 +242,52 @@ def get_timer_display(progress, color='normal', sign=False):
     return (color, progress_text)
 
 
+def get_sparkline(values, width):
+    """
+    Render durations as a sparkline of at most *width* characters, the
+    highest bars being the slowest attempts.
+
+    When there are more values than characters, each character is the mean
+    of consecutive values.
+    """
+    if not values:
+        return ''
+
+    if len(values) > width:
+        values = [
+            sum(values[i * len(values) // width:(i + 1) * len(values) // width]) //
+            ((i + 1) * len(values) // width - i * len(values) // width)
+            for i in range(width)
+        ]
+
+    bars = '▁▂▃▄▅▆▇█'
+    low, high = min(values), max(values)
+    if low == high:
+        return bars[3] * len(values)
+
+    return ''.join(bars[(value - low) * (len(bars) - 1) // (high - low)] for value in values)
+
+
+class MarkupText(urwid.Text):
+    """
+    Text widget which is only invalidated when its markup changes.
+
+    urwid.Text.set_text() always invalidates the canvas cache, even when the
+    displayed text is the same, which is frequent as times are rounded.
+    """
+
+    def __init__(self, markup, *args, **kwargs):
+        self.markup = None
+        super().__init__(markup, *args, **kwargs)
+
+    def set_text(self, markup):
+        if markup == self.markup:
+            return
+
+        self.markup = markup
+        super().set_text(markup)
+
+
 class Segment(urwid.WidgetWrap):
     def __init__(
         self,
@@ -82,55 +301,84 @@ class Segment(urwid.WidgetWrap):
         pb=None,
         pb_start=None,
         progress=None,
-        progress_start=None
+        progress_start=None,
+        markup=None,
+        compact=False,
+        loading=None,
+        loading_start=None
     ):
         # Route meta data
         self.id = id
         self.name = name
-        self.name_widget = urwid.Text(self.name, align='center')
+        self.compact = compact
+        self.name_widget = urwid.Text(self.name, align='left' if compact else 'center')
         self.color = color
         if color:
             self.name_widget = urwid.AttrWrap(self.name_widget, color)
         self.build = build or []
         self.description = description
-        text = []
-        for b in self.build:
-            text.append(('build', b + '\n'))
-
-        color = 'normal'
-        for part in self.description.split('|'):
-            text.append((color, part))
-            color = 'hilight' if color == 'normal' else 'normal'
-        self.description_widget = urwid.Text(text)
         self.stats = stats
-        self.stats_widget = urwid.Text('\n'.join(f'{key} {value}' for key, value in self.stats.items()), align='right')
+        # The compact layout does not show descriptions and stats.
+        if not compact:
+            if markup is None:
+                markup = (get_description_markup(self.build, self.description), get_stats_text(self.stats))
+            self.description_widget = urwid.Text(list(markup[0]))
+            self.stats_widget = urwid.Text(markup[1], align='right')
 
         # PB
         self.pb = pb
         self.gold = gold
-        self.pb_start = pb_start or (None if self.pb is None else 0.0)
+        self.pb_start = pb_start or (None if self.pb is None else 0)
+        # (pb_start, pb) of every comparison, the first one being the PB.
+        self.comparisons = [(self.pb_start, self.pb)]
+        # The comparison changed since the row was updated, it is updated
+        # when it is rendered.
+        self.stale = False
 
         # Run
         self.progress = progress
-        self.progress_start = progress_start or (None if self.progress is None else 0.0)
-        self.time_widget = urwid.Text('', align='right')
-        self.duration_widget = urwid.Text('', align='right')
-        self.gold_widget = urwid.Text('', align='right')
-        self.diff_widget = urwid.Text('', align='right')
+        self.progress_start = progress_start or (None if self.progress is None else 0)
+        # Loading time of the run at the start and at the end of the segment
+        self.loading = loading
+        self.loading_start = loading_start
+        # The previous segment was skipped, so this one is timed from its
+        # start and its duration is not a segment time.
+        self.after_skip = False
+        self.time_widget = MarkupText('', align='right')
+        self.duration_widget = MarkupText('', align='right')
+        self.gold_widget = MarkupText('', align='right')
+        self.diff_widget = MarkupText('', align='right')
+
+        # Last durations of the segment in the history, and the duration of
+        # this run its sparkline was rendered with.
+        self.history = None
+        self.sparkline_duration = None
+        if not compact:
+            self.sparkline_widget = MarkupText('', align='center')
 
         self.update(current=False)
 
-        self.view = urwid.Columns(
-            [
-                ('weight', 8, self.name_widget),
-                ('weight', 16, self.description_widget),
-                ('weight', 4, self.stats_widget),
-                ('weight', 2, self.time_widget),
-                ('weight', 2, self.duration_widget),
-                ('weight', 2, self.gold_widget),
-                ('weight', 2, urwid.Padding(self.diff_widget, ('fixed right', 1))),
-            ],
-        )
+        if compact:
+            self.view = urwid.Columns(
+                [
+                    ('weight', 8, self.name_widget),
+                    ('weight', 2, self.diff_widget),
+                    ('weight', 2, urwid.Padding(self.time_widget, ('fixed right', 1))),
+                ],
+            )
+        else:
+            self.view = urwid.Columns(
+                [
+                    ('weight', 8, self.name_widget),
+                    ('weight', 16, self.description_widget),
+                    ('weight', 4, self.stats_widget),
+                    ('weight', 3, self.sparkline_widget),
+                    ('weight', 2, self.time_widget),
+                    ('weight', 2, self.duration_widget),
+                    ('weight', 2, self.gold_widget),
+                    ('weight', 2, urwid.Padding(self.diff_widget, ('fixed right', 1))),
+                ],
+            )
         self.view = urwid.AttrWrap(self.view, 'body')
 
         super().__init__(self.view)
@@ -145,16 +393,87 @@ class Segment(urwid.WidgetWrap):
 
         return self.progress - self.progress_start
 
+    @property
+    def loading_duration(self):
+        """
+        Loading time during the segment.
+        """
+        if self.loading is None or self.loading_start is None:
+            return 0
+
+        return self.loading - self.loading_start
+
+    def is_gold(self, duration):
+        """
+        Whether a duration of the segment beats its gold.
+        """
+        return duration is not None and not self.after_skip and (self.gold is None or duration < self.gold)
+
+    def set_comparison(self, idx):
+        """
+        Compare the segment against an other reference run.
+
+        The row is only updated when it is rendered, so that switching the
+        comparison does not update the rows out of the screen.
+
+        :param idx: index of the comparison in :attr:`comparisons`
+        :type idx: int
+        """
+        self.pb_start, self.pb = self.comparisons[idx]
+        self.stale = True
+        self._invalidate()
+
+    def render(self, size, focus=False):
+        if self.stale:
+            # Only the current segment is updated on each tick, and it is
+            # never stale.
+            self.update(current=False)
+        return super().render(size, focus)
+
+    def get_delta(self, idx):
+        """
+        Difference between the current time and the split of a comparison.
+        """
+        pb_start, pb = self.comparisons[idx]
+        if self.progress is None or pb is None:
+            return None
+
+        return self.progress - (pb_start + pb)
+
+    def set_history(self, durations, sparkline):
+        """
+        :param durations: last durations of the segment, from the oldest
+        :param sparkline: sparkline of *durations*, rendered by the loader
+        """
+        self.history = durations
+        self.sparkline_duration = None
+        if not self.compact:
+            self.sparkline_widget.set_text(('diff', sparkline))
+
+    def update_sparkline(self, duration):
+        """
+        Add the duration of this run to the sparkline once the segment is
+        split, or remove it.
+        """
+        if self.history is None or duration == self.sparkline_duration:
+            return
+
+        self.sparkline_duration = duration
+        values = self.history if duration is None else self.history[1 - History.SPARKLINE_RUNS:] + [duration]
+        self.sparkline_widget.set_text(('diff', get_sparkline(values, History.SPARKLINE_WIDTH)))
+
     def reset(self):
         """
         Reset the segment.
 
         It saves gold if any.
         """
-        if self.duration is not None and (self.gold is None or self.duration < self.gold):
+        if self.is_gold(self.duration):
             self.gold = self.duration
 
         self.progress = self.progress_start = None
+        self.loading = self.loading_start = None
+        self.after_skip = False
 
     def update(self, current=True):
         """
@@ -163,10 +482,11 @@ class Segment(urwid.WidgetWrap):
         :param current: if True, it is the current played segment
         :type current: bool
         """
+        self.stale = False
         # PB time and diff with current time
         color = 'normal'
         if self.duration is not None:
-            if not current and (self.gold is None or self.duration < self.gold):
+            if not current and self.is_gold(self.duration):
                 color = 'gold'
             elif self.pb is not None:
                 if self.progress > (self.pb_start + self.pb):
@@ -174,10 +494,23 @@ class Segment(urwid.WidgetWrap):
                 else:
                     color = 'ahead gain' if self.duration < self.pb else 'ahead loss'
 
+        delta = None
+        if self.progress is not None and (not current or self.duration > (self.gold or 0) or self.pb is None or self.progress >= (self.pb_start + self.pb)):
+            delta = get_timer_display(self.progress - (0 if self.pb is None else (self.pb_start + self.pb)), color, sign=True)
+
+        if self.compact:
+            # One line: delta with the comparison, and current (or PB) time
+            self.diff_widget.set_text(delta or '')
+            if self.progress is not None:
+                self.time_widget.set_text(get_timer_display(self.progress))
+            else:
+                self.time_widget.set_text(get_timer_display((self.pb_start + self.pb) if self.pb is not None else None, 'diff'))
+            return
+
         text = [get_timer_display((self.pb_start + self.pb) if self.pb is not None else None)]
-        if self.progress is not None and (not current or self.duration > (self.gold or 0.0) or self.pb is None or self.progress >= (self.pb_start + self.pb)):
+        if delta:
             text.append('\n',)
-            text.append(get_timer_display(self.progress - (0.0 if self.pb is None else (self.pb_start + self.pb)), color, sign=True))
+            text.append(delta)
 
         self.time_widget.set_text(text)
 
@@ -185,7 +518,7 @@ class Segment(urwid.WidgetWrap):
         text = [get_timer_display(self.pb)]
         if self.progress is not None:
             text.append('\n')
-            if (self.gold is None or self.duration < self.gold) and not current:
+            if self.is_gold(self.duration) and not current:
                 color = 'gold'
             elif self.pb is not None:
                 if self.duration > self.pb:
@@ -207,13 +540,16 @@ class Segment(urwid.WidgetWrap):
                 if self.pb == self.gold:
                     text.append(('fixed gold', '0'))
                 else:
-                    text.append(get_timer_display(self.pb - self.gold, sign=True, color=('diff' if self.pb < self.gold + 60 else 'behind loss')))
+                    text.append(get_timer_display(self.pb - self.gold, sign=True, color=('diff' if self.pb < self.gold + 60000 else 'behind loss')))
             if self.duration is not None:
                 text.append('\n')
-                text.append(get_timer_display(self.duration - self.gold, sign=True, color='gold' if self.duration < self.gold and not current else 'diff'))
+                text.append(get_timer_display(self.duration - self.gold, sign=True, color='gold' if self.is_gold(self.duration) and not current else 'diff'))
 
         self.diff_widget.set_text(text or '')
 
+        # Only changes when the segment is split, not on every tick.
+        self.update_sparkline(None if current or self.after_skip else self.duration)
+
     def stop(self):
         self.update(current=False)
 
@@ -302,18 +638,24 @@ class MainWindow(urwid.WidgetWrap):
         'build':        'focus build',
     }
 
+    # Below this size, the compact layout is used by default.
+    COMPACT_COLUMNS = 100
+    COMPACT_ROWS = 30
+
     def __init__(self, controller):
         self.controller = controller
+        self.compact = False
 
-        self.stats = urwid.Text('', align='center')
-        self.timer = urwid.Text('', align='right')
-        self.pb = urwid.Text('', align='center')
+        self.stats = MarkupText('', align='center')
+        self.timer = MarkupText('', align='right')
+        self.pb = MarkupText('', align='center')
         self.header = urwid.AttrWrap(urwid.Columns([self.stats, self.pb, self.timer]), 'header')
         self.table_head = urwid.Columns(
             [
                 ('weight', 8, urwid.Text('')),
                 ('weight', 16, urwid.Text('')),
                 ('weight', 4, urwid.Text('')),
+                ('weight', 3, urwid.Text('History', align='center')),
                 ('weight', 2, urwid.Text('Time', align='right')),
                 ('weight', 2, urwid.Text('Sgmt', align='right')),
                 ('weight', 2, urwid.Text('Gold', align='right')),
@@ -323,7 +665,7 @@ class MainWindow(urwid.WidgetWrap):
         header = urwid.AttrWrap(urwid.Pile([self.header, self.table_head, urwid.Divider('─')]), 'table head')
 
         self.message_widget = urwid.AttrWrap(urwid.Text('', align='center'), 'footer msg')
-        self.keys_widget = urwid.Text('')
+        self.keys_widget = MarkupText('')
         self.run_widget = urwid.Text('', align='right')
 
         self.footer = urwid.AttrWrap(
@@ -340,6 +682,27 @@ class MainWindow(urwid.WidgetWrap):
 
         super().__init__(self.view)
 
+    def set_compact(self):
+        """
+        Switch to the compact layout, for small terminals and slow links: one
+        line per segment with its name, delta and time, a one line timer,
+        and no key bindings in the footer.
+
+        It must be done before adding segments.
+        """
+        self.compact = True
+        self.stats.set_align_mode('left')
+        self.header = urwid.AttrWrap(urwid.Columns([('weight', 4, self.stats), self.timer]), 'header')
+        self.table_head = urwid.Columns(
+            [
+                ('weight', 8, urwid.Text('')),
+                ('weight', 2, urwid.Text('Diff', align='right')),
+                ('weight', 2, urwid.Padding(urwid.Text('Time', align='right'), ('fixed right', 1))),
+            ],
+        )
+        self.view.header = urwid.AttrWrap(urwid.Pile([self.header, self.table_head]), 'table head')
+        self.view.footer = urwid.AttrWrap(self.message_widget, 'footer')
+
     def error(self, message, color='footer error'):
         self.message_widget.set_text((color, message))
 
@@ -348,7 +711,12 @@ class MainWindow(urwid.WidgetWrap):
 
     def add_segment(self, segment):
         self.segments.append(urwid.AttrMap(segment, 'segment', self.focus_map))
-        self.segments.append(urwid.AttrMap(urwid.Divider('─'), 'line'))
+        if not self.compact:
+            self.segments.append(urwid.AttrMap(urwid.Divider('─'), 'line'))
+
+    def set_focus(self, idx):
+        self.listbox.set_focus(idx if self.compact else idx * 2, 'above')
+        self.listbox.set_focus_valign('middle')
 
     def set_enabled(self, enabled):
         for key in self.focus_map:
@@ -361,13 +729,181 @@ class MainWindow(urwid.WidgetWrap):
             segment._invalidate()
 
 
+class ValidationError(ValueError):
+    """
+    A run or route file is malformed.
+    """
+
+    def __init__(self, path, line, message):
+        self.path = path
+        self.line = line
+        self.message = message
+        super().__init__(f'{path}:{line}: {message}' if line else f'{path}: {message}')
+
+
+class YAMLLoader(getattr(yaml, 'CSafeLoader', yaml.SafeLoader)):
+    """
+    Safe YAML loader which remembers the line of every mapping and sequence,
+    to report precise validation errors.
+    """
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.lines = {}
+
+    def construct_yaml_map(self, node):
+        data = {}
+        self.lines[id(data)] = node.start_mark.line + 1
+        yield data
+        data.update(self.construct_mapping(node))
+
+    def construct_yaml_seq(self, node):
+        data = []
+        self.lines[id(data)] = node.start_mark.line + 1
+        yield data
+        data.extend(self.construct_sequence(node))
+
+
+YAMLLoader.add_constructor('tag:yaml.org,2002:map', YAMLLoader.construct_yaml_map)
+YAMLLoader.add_constructor('tag:yaml.org,2002:seq', YAMLLoader.construct_yaml_seq)
+
+
+def load_yaml(path, stream):
+    """
+    Parse a YAML document.
+
+    :returns: the document, and the line of its mappings and sequences,
+              indexed by their id()
+    :raises ValidationError: if it is not valid YAML
+    """
+    loader = YAMLLoader(stream)
+    try:
+        return loader.get_single_data(), loader.lines
+    except yaml.MarkedYAMLError as e:
+        raise ValidationError(path, e.problem_mark.line + 1 if e.problem_mark else None, e.problem) from e
+    except yaml.YAMLError as e:
+        raise ValidationError(path, None, str(e)) from e
+    finally:
+        loader.dispose()
+
+
+class Validator:
+    """
+    Check the structure of a parsed run or route file.
+
+    Values are checked in a single walk of the parsed document, and errors
+    are reported with the line of the closest mapping or sequence.
+
+    :param path: path of the file
+    :param lines: lines returned by :func:`load_yaml`
+    """
+
+    def __init__(self, path, lines):
+        self.path = path
+        self.lines = lines
+
+    def error(self, parent, message):
+        raise ValidationError(self.path, self.lines.get(id(parent)), message)
+
+    def mapping(self, value, parent, name, required=(), optional=None):
+        """
+        :param optional: other allowed keys, or None to allow any key
+        """
+        if not isinstance(value, dict):
+            self.error(parent, f'{name} should be a mapping')
+
+        for key in required:
+            if key not in value:
+                self.error(value, f'missing {key!r} in {name}')
+
+        if optional is not None:
+            for key in value:
+                if key not in required and key not in optional:
+                    self.error(value, f'unknown key {key!r} in {name}')
+
+        return value
+
+    def sequence(self, value, parent, name):
+        if not isinstance(value, list):
+            self.error(parent, f'{name} should be a list')
+
+        return value
+
+    def string(self, value, parent, name, nullable=False):
+        if not isinstance(value, str) and not (nullable and value is None):
+            self.error(parent, f'{name} should be a string')
+
+    def duration(self, value, parent, name):
+        if value is None:
+            return
+
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            self.error(parent, f'{name} should be a positive duration, not {value!r}')
+
+    def run(self, d):
+        self.mapping(d, None, 'run', ('route', 'created', 'updated'), ('segs', 'run', 'version'))
+        self.string(d['route'], d, "'route'")
+        # Runs are sorted by update date, a PB is only created once beaten.
+        if not isinstance(d['updated'], datetime):
+            self.error(d, "'updated' should be a date")
+        if d['created'] is not None and not isinstance(d['created'], datetime):
+            self.error(d, "'created' should be a date")
+
+        version = d.get('version', 1)
+        if isinstance(version, bool) or not isinstance(version, int) or not 1 <= version <= Run.VERSION:
+            self.error(d, f'unsupported run format version {version!r}')
+
+        if 'segs' in d:
+            segments = self.mapping(d['segs'], d, "'segs'").items()
+        elif 'run' in d:
+            segments = enumerate(self.sequence(d['run'], d, "'run'"))
+        else:
+            self.error(d, "missing 'segs' in run")
+
+        parent = d.get('segs', d.get('run'))
+        for id, seg in segments:
+            name = f'segment {id}'
+            self.mapping(seg, parent, name, ('duration', 'pb', 'gold'))
+            for key in ('duration', 'pb', 'gold'):
+                self.duration(seg[key], seg, f'{key!r} of {name}')
+                game_key = get_seg_key(key, 'game')
+                if game_key in seg:
+                    self.duration(seg[game_key], seg, f'{game_key!r} of {name}')
+
+    def route(self, d):
+        self.mapping(d, None, 'route', ('game', 'name', 'route'), ())
+        self.string(d['game'], d, "'game'")
+        self.string(d['name'], d, "'name'")
+
+        ids = set()
+        for idx, seg in enumerate(self.sequence(d['route'], d, "'route'")):
+            name = f'segment #{idx + 1}'
+            self.mapping(seg, d['route'], name, ('id', 'name', 'description'))
+            self.string(seg['id'], seg, f"'id' of {name}")
+            self.string(seg['name'], seg, f"'name' of {name}")
+            self.string(seg['description'], seg, f"'description' of {name}")
+            self.string(seg.get('color'), seg, f"'color' of {name}", nullable=True)
+            for b in self.sequence(seg.get('build') or [], seg, f"'build' of {name}"):
+                self.string(b, seg['build'], f"items of 'build' of {name}")
+            self.mapping(seg.get('stats', {}), seg, f"'stats' of {name}")
+
+            if seg['id'] in ids:
+                self.error(seg, f"duplicate id {seg['id']!r}")
+            ids.add(seg['id'])
+
+
 @dataclass
 class Run:
+    # Version 1 stored durations as float seconds, version 2 stores them as
+    # integer milliseconds.
+    VERSION = 2
+
     path: str
     route: str
     created: datetime
     updated: datetime
     segs: dict
+    version: int = VERSION
 
     @property
     def name(self):
@@ -375,19 +911,41 @@ class Run:
 
     @classmethod
     def load(cls, path):
+        """
+        :raises ValidationError: if the file is malformed
+        """
         with open(path, 'r', encoding='utf-8') as fp:
-            d = yaml.safe_load(fp)
+            d, lines = load_yaml(path, fp)
 
+        Validator(path, lines).run(d)
+        return cls.from_dict(path, d)
+
+    @classmethod
+    def from_dict(cls, path, d):
+        """
+        Build a run from the content of a run file, in any format version.
+        """
         d['path'] = path
         if 'segs' not in d:
             d['segs'] = {}
 
         if 'run' in d:
-            route = Route.load(d['route'])
+            try:
+                route = Route.load(d['route'])
+            except OSError as e:
+                raise ValidationError(path, None, f"cannot read route {d['route']!r}: {e.strerror}")
+            if len(d['run']) < len(route.route):
+                raise ValidationError(path, None, f"'run' has less segments than the route {route.path}")
             for idx, seg in enumerate(route.route):
                 d['segs'][seg['id']] = d['run'][idx]
             d.pop('run')
 
+        if d.get('version', 1) < 2:
+            for seg in d['segs'].values():
+                for key in ('duration', 'pb', 'gold'):
+                    seg[key] = to_ms(seg.get(key))
+            d['version'] = cls.VERSION
+
         return Run(**d)
 
     @classmethod
@@ -399,7 +957,7 @@ class Run:
             path,
             route.path,
             created=None,
-            updated=None,
+            updated=datetime.now(),
             segs=segs
         )
 
@@ -408,6 +966,9 @@ class Run:
         segs = {}
         for id, segment in pb.segs.items():
             segs[id] = {'pb': segment['duration'], 'duration': None, 'gold': segment['gold']}
+            for clock in CLOCKS[1:]:
+                segs[id][get_seg_key('pb', clock)] = get_seg_time(segment, 'duration', clock)
+                segs[id][get_seg_key('gold', clock)] = get_seg_time(segment, 'gold', clock)
         return Run(
             path,
             pb.route,
@@ -419,18 +980,29 @@ class Run:
     def get_route(self):
         return Route.load(self.route)
 
-    def iter_segments(self):
+    def iter_segments(self, compact=False, clock='real'):
+        """
+        :param clock: clock of the times of segments, the loading time of
+                      segments is the difference between real and game times
+        """
         route = self.get_route()
 
         pb_start = None
         progress_start = None
-        for route_seg in route.route:
+        loading_start = 0
+        for route_seg, markup in zip(route.route, route.markup):
             try:
-                run_seg = self.segs[route_seg['id']]
+                seg = self.segs[route_seg['id']]
             except KeyError:
                 # This is probably a new segment in the route that was not
                 # present in the run/pb.
-                run_seg = {'pb': None, 'duration': None, 'gold': None}
+                seg = {'pb': None, 'duration': None, 'gold': None}
+
+            run_seg = {key: get_seg_time(seg, key, clock) for key in ('duration', 'pb', 'gold')}
+            loading = None
+            if run_seg['duration'] is not None:
+                real, game = seg.get('duration'), get_seg_time(seg, 'duration', 'game')
+                loading = loading_start + (real - game if real is not None and game is not None else 0)
 
             segment = Segment(
                 route_seg['id'],
@@ -442,16 +1014,23 @@ class Run:
                 run_seg['gold'],
                 run_seg['pb'],
                 pb_start,
-                None if run_seg.get('duration') is None else ((progress_start or 0.0) + run_seg.get('duration')),
-                None if run_seg.get('duration') is None else progress_start or (0.0 if run_seg.get('duration') else progress_start)
+                None if run_seg.get('duration') is None else ((progress_start or 0) + run_seg.get('duration')),
+                None if run_seg.get('duration') is None else progress_start or (0 if run_seg.get('duration') else progress_start),
+                markup,
+                compact,
+                loading,
+                None if loading is None else loading_start,
             )
             yield segment
 
+            if loading is not None:
+                loading_start = loading
+
             if segment.pb is not None:
-                pb_start = (pb_start or 0.0) + segment.pb
+                pb_start = (pb_start or 0) + segment.pb
 
             if segment.duration is not None:
-                progress_start = (progress_start or 0.0) + segment.duration
+                progress_start = (progress_start or 0) + segment.duration
 
     def save(self):
         d = asdict(self)
@@ -460,34 +1039,181 @@ class Run:
         with open(self.path, 'w', encoding='utf-8') as fp:
             yaml.dump(d, fp)
 
+    @property
+    def complete(self):
+        return all(seg.get('duration') is not None for seg in self.segs.values())
+
     @classmethod
-    def iter_runs(cls, path):
+    def iter_runs(cls, path, archived=False, errors=None):
+        """
+        Iterate on runs stored in a directory.
+
+        Malformed files are skipped.
+
+        :param archived: also iterate on runs packed in archives
+        :type archived: bool
+        :param errors: list to append errors of malformed files to, instead
+                       of printing them
+        :type errors: list
+        """
         for root, _, files in os.walk(path):
             for f in files:
                 if f.endswith('.yml'):
-                    yield Run.load(os.path.join(root, f))
+                    try:
+                        yield Run.load(os.path.join(root, f))
+                    except ValidationError as e:
+                        if errors is None:
+                            print(e, file=sys.stderr)
+                        else:
+                            errors.append(e)
+                elif archived and f == Archive.PATH:
+                    yield from Archive(root).iter_runs()
+
+
+class Archive:
+    """
+    Old runs of a runs directory, packed in a single file.
+
+    Runs are stored in a gzip-compressed YAML stream, one document per run,
+    with the content of their file as is.
+    New runs are appended in a new gzip member, so the archive is never
+    rewritten. An index summarizes archived runs, for listings which do not
+    need the segments.
+
+    :param path: runs directory
+    """
+    PATH = 'archive.yml.gz'
+    INDEX = 'archive.idx'
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def load_index(self):
+        try:
+            with open(self.path / self.INDEX, 'r', encoding='utf-8') as fp:
+                return yaml.safe_load(fp) or []
+        except FileNotFoundError:
+            return []
+
+    def iter_runs(self):
+        try:
+            fp = gzip.open(self.path / self.PATH, 'rt', encoding='utf-8')
+        except FileNotFoundError:
+            return
+
+        with fp:
+            for d in yaml.safe_load_all(fp):
+                name = d.pop('name')
+                yield Run.from_dict(self.path / f'{name}.yml', d)
+
+    def add(self, runs):
+        """
+        Pack runs in the archive, and remove their files.
+        """
+        docs = []
+        index = self.load_index()
+        for run in runs:
+            with open(run.path, 'r', encoding='utf-8') as fp:
+                d = yaml.safe_load(fp)
+
+            d['name'] = run.name
+            docs.append(d)
+            index.append({
+                'name': run.name,
+                'route': run.route,
+                'created': run.created,
+                'updated': run.updated,
+                'duration': get_run_duration(d),
+                'game_duration': get_run_duration(d, 'game'),
+            })
+
+        with gzip.open(self.path / self.PATH, 'at', encoding='utf-8') as fp:
+            yaml.dump_all(docs, fp, explicit_start=True)
+
+        with open(self.path / self.INDEX, 'w', encoding='utf-8') as fp:
+            yaml.dump(index, fp, sort_keys=False)
+
+        for run in runs:
+            os.unlink(run.path)
 
 
 @dataclass
 class Route:
     ROUTES_DIR = 'routes'
+    # Increment when the content of bundles changes.
+    BUNDLE_VERSION = 2
 
     path: str
     game: str
     name: str
     route: list
+    # Computed by compile(): position of segments by id, and markup of their
+    # description and stats.
+    index: dict = field(default=None, repr=False, compare=False)
+    markup: list = field(default=None, repr=False, compare=False)
+    # SHA-256 of the source file
+    hash: str = field(default=None, repr=False, compare=False)
+
+    @property
+    def bundle_path(self):
+        return Path(self.path).with_suffix('.bundle')
 
     @classmethod
     def load(cls, path):
-        with open(path, 'r', encoding='utf-8') as fp:
-            d = yaml.safe_load(fp)
+        """
+        Load a route, from its compiled bundle if it is up to date.
+
+        :raises ValidationError: if the file is malformed
+        """
+        with open(path, 'rb') as fp:
+            source = fp.read()
 
+        digest = hashlib.sha256(source).hexdigest()
+        try:
+            with open(Path(path).with_suffix('.bundle'), 'rb') as fp:
+                bundle = marshal.load(fp)
+            if bundle['version'] == cls.BUNDLE_VERSION and bundle['route']['hash'] == digest:
+                return Route(path, **bundle['route'])
+        except Exception:
+            # Missing, corrupted or foreign bundle: it is only a cache of the
+            # source file.
+            pass
+
+        d, lines = load_yaml(path, source)
+        Validator(path, lines).route(d)
         d['path'] = path
-        return Route(**d)
+        d['hash'] = digest
+        route = Route(**d)
+        route.compile()
+        return route
+
+    def compile(self):
+        self.index = {seg['id']: idx for idx, seg in enumerate(self.route)}
+        self.markup = [
+            (get_description_markup(seg.get('build') or [], seg['description']), get_stats_text(seg.get('stats', {})))
+            for seg in self.route
+        ]
+
+    def save_bundle(self):
+        """
+        Write the compiled route next to its source file.
+
+        Bundles can come from other players with the runs, so they are
+        written with marshal, which only loads plain values, unlike pickle
+        which can run code.
+        """
+        d = asdict(self)
+        d.pop('path')
+        bundle = {'version': self.BUNDLE_VERSION, 'route': d}
+        with open(self.bundle_path, 'wb') as fp:
+            marshal.dump(bundle, fp)
 
     def save(self):
         d = asdict(self)
         d.pop('path')
+        d.pop('index')
+        d.pop('markup')
+        d.pop('hash')
 
         with open(self.path, 'w', encoding='utf-8') as fp:
             yaml.dump(d, fp)
@@ -500,75 +1226,680 @@ class Route:
                     yield Route.load(os.path.join(root, f))
 
 
-class Spliter:
-    def __init__(self):
-        self.pb = None
-        self.route = None
-        self.run = None
+class Comparison:
+    """
+    Reference segment durations a run can be compared against.
+
+    :param name: label displayed in the header
+    :type name: str
+    :param durations: segment durations, indexed by segment id
+    :type durations: dict
+    """
+    LAST_RUNS = 10
+    # Comparisons computed from the history of the runs directory
+    AGGREGATES = {
+        'average': statistics.mean,
+        'median': statistics.median,
+    }
 
-        self.view = MainWindow(self)
-        self.current_segment_idx = -1
-        self.segments = []
-        self.progress = 0.0
-        self.paused = True
-        self.debug = False
-        self.pressed_key = None
-        self.pressed_key_time = None
+    def __init__(self, name, durations):
+        self.name = name
+        self.durations = durations
 
-        self.loop = urwid.MainLoop(self.view, self.view.palette, unhandled_input=self.unhandled_input)
-        self.loop.screen.set_terminal_properties(colors=2**24)
+    @classmethod
+    def from_run(cls, name, run, clock='real'):
+        return cls(name, {id: get_seg_time(seg, 'duration', clock) for id, seg in run.segs.items()})
 
-    @property
-    def current_segment(self):
-        if self.current_segment_idx < 0:
-            return None
+    @classmethod
+    def from_history(cls, name, history):
+        """
+        Build a comparison from the last durations of each segment.
 
-        return self.segments[self.current_segment_idx]
+        :param name: one of :attr:`AGGREGATES`
+        :type history: History
+        """
+        func = cls.AGGREGATES[name]
+        return cls(name, {
+            id: int(round(func(values[-cls.LAST_RUNS:])))
+            for id, values in zip(history.ids, history.durations)
+            if values
+        })
 
-    @property
-    def previous_segment(self):
-        if self.current_segment_idx < 1:
-            return None
+    @classmethod
+    def load(cls, spec, clock='real'):
+        """
+        Load a comparison against a run file from the command line.
+        """
+        path = Path(spec)
+        name = f'{path.parent.parent.name}/{path.stem}' if path.parent.parent.name else path.stem
+        return cls.from_run(name, Run.load(path), clock)
 
-        return self.segments[self.current_segment_idx-1]
+    def iter_splits(self, segments):
+        """
+        Compute the (pb_start, pb) table of the comparison for segments.
+        """
+        pb_start = None
+        for segment in segments:
+            duration = self.durations.get(segment.id)
+            if duration is None:
+                yield (pb_start, None)
+                continue
 
-    def iter_routes(self):
-        for root, _, files in os.walk('routes'):
-            for f in files:
-                if f.endswith('.yml'):
-                    yield Route.load(os.path.join(root, f))
+            yield (pb_start or 0, duration)
+            pb_start = (pb_start or 0) + duration
+
+
+class History:
+    """
+    Past durations of the segments of a route, in compact arrays.
+
+    Runs must be added from the oldest to the most recent one, then
+    :meth:`finish` precomputes the stats displayed at each split.
+
+    :param ids: segment ids in route order
+    """
+    # Number of attempts in sparklines, and their width in characters
+    SPARKLINE_RUNS = 60
+    SPARKLINE_WIDTH = 12
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.runs = 0
+        # Finished durations of each segment, from the oldest run
+        self.durations = [array.array('q') for _ in ids]
+        # Number of runs reset during each segment
+        self.resets = array.array('q', [0] * len(ids))
+        # Durations of the most recent run, None for segments it did not finish
+        self.last = [None] * len(ids)
+        self.averages = [None] * len(ids)
+        # Share of the runs reaching a segment which were reset during it
+        self.reset_rates = [None] * len(ids)
+        self.sparklines = [''] * len(ids)
+
+    def add(self, durations):
+        """
+        :param durations: durations of a run in route order, None for
+                          segments it did not finish
 
-    def main(self):
-        if len(sys.argv) < 2 or sys.argv[1] in ('-h', '--help'):
-            print(f'{sys.argv[0]} RUN_DIR [RUN_ID]', file=sys.stderr)
-            return 1
+        Runs without any finished segment, such as runs saved before being
+        started, are not attempts and are ignored.
+        """
+        if all(duration is None for duration in durations):
+            return
 
-        run_dir = Path(sys.argv[1])
+        self.runs += 1
+        for idx, duration in enumerate(durations):
+            if duration is None:
+                self.resets[idx] += 1
+                break
+            self.durations[idx].append(duration)
+        self.last = durations
+
+    def finish(self):
+        reached = self.runs
+        for idx, values in enumerate(self.durations):
+            if values:
+                self.averages[idx] = sum(values) // len(values)
+            if reached:
+                self.reset_rates[idx] = self.resets[idx] / reached
+            reached -= self.resets[idx]
+            self.sparklines[idx] = get_sparkline(self.get_last(idx), self.SPARKLINE_WIDTH)
+
+    def get_last(self, idx):
+        """
+        Durations of segment *idx* shown in its sparkline, from the oldest.
+        """
+        return self.durations[idx][-self.SPARKLINE_RUNS:].tolist()
 
-        if not (run_dir / 'pb.yml').exists():
-            print('No runs in %s. Do you want to create it? (Y/n)' % colored(run_dir, 'yellow'), end=' ', flush=True)
-            if sys.stdin.readline().strip() in ('N', 'n'):
-                return 0
+    @classmethod
+    def load(cls, ids, runs, clock='real'):
+        """
+        Build the history from runs in any order. Only the durations of runs
+        are kept while loading.
+        """
+        rows = []
+        for run in runs:
+            rows.append((run.updated, [get_seg_time(run.segs.get(id, {}), 'duration', clock) for id in ids]))
+        rows.sort(key=lambda row: row[0])
+
+        history = cls(ids)
+        for _, durations in rows:
+            history.add(durations)
+        history.finish()
+        return history
+
+
+class HistoryLoader(threading.Thread):
+    """
+    Load the history of a runs directory in the background, while the
+    splitter is already running.
+
+    The :class:`History`, and the :class:`Predictor` built from it, are put
+    in :attr:`results` for the UI thread, which polls it without blocking.
+
+    :param segments: list of (segment id, fallback duration) in route order
+    :param exclude: path of the current run, which is not part of its history
+    :param clock: clock of the durations
+    """
+
+    def __init__(self, run_dir, segments, exclude=None, clock='real'):
+        super().__init__(name='history', daemon=True)
+        self.run_dir = run_dir
+        self.segments = segments
+        self.exclude = Path(exclude) if exclude else None
+        self.clock = clock
+        self.results = queue.Queue()
+        self.errors = []
+
+    def run(self):
+        try:
+            runs = (
+                r for r in Run.iter_runs(self.run_dir, archived=True, errors=self.errors)
+                if r.name != 'pb' and Path(r.path) != self.exclude
+            )
+            history = History.load([id for id, _ in self.segments], runs, self.clock)
+            self.results.put((history, Predictor.from_history(self.segments, history)))
+        except Exception as e:
+            self.results.put(e)
+
+
+class Predictor:
+    """
+    Estimate the final time of a run from the history of its segments.
+
+    The remaining time after each split is simulated by drawing durations
+    of the following segments from their past attempts (Monte Carlo). Its
+    mean and 10th/90th percentiles are precomputed, so a prediction during
+    the run is a lookup.
+
+    :param segments: list of (segment id, fallback duration) in route order,
+                     the fallback being used for segments without history
+    :param history: past durations of segments, indexed by segment id
+    :type history: dict
+    """
+    SAMPLES = 2000
+    # Only the last attempts of each segment are used, as players improve.
+    LAST_RUNS = 5
+
+    def __init__(self, segments, history, samples=SAMPLES, seed=0):
+        rng = random.Random(seed)
+        totals = [0] * samples
+        low, high = samples // 10, samples - samples // 10 - 1
+
+        # remaining[idx] is (mean, p10, p90) of the time needed to finish the
+        # run from the start of segment idx.
+        self.remaining = [(0, 0, 0)]
+        for id, fallback in reversed(segments):
+            values = history.get(id) or [fallback or 0]
+            for i in range(samples):
+                totals[i] += rng.choice(values)
+
+            ordered = sorted(totals)
+            self.remaining.append((sum(totals) // samples, ordered[low], ordered[high]))
+        self.remaining.reverse()
 
-            routes = []
-            for idx, r in enumerate(Route.iter_routes()):
-                print(' %s %s − %s' % (colored(idx, 'magenta'), colored(r.game, 'green'), colored(r.name, 'blue')))
-                routes.append(r)
+    @classmethod
+    def from_history(cls, segments, history):
+        """
+        :type history: History
+        """
+        return cls(segments, {
+            id: values[-cls.LAST_RUNS:].tolist()
+            for id, values in zip(history.ids, history.durations)
+        })
 
-            while self.route is None:
-                print('What route do you want to use?', end=' ', flush=True)
-                i = sys.stdin.readline().strip()
-                try:
-                    self.route = routes[int(i)-1]
-                except (ValueError, TypeError):
-                    if i == 'q':
-                        return 0
-                except IndexError:
-                    continue
+    def predict(self, idx, progress):
+        """
+        Predicted final time, when segment *idx* starts at *progress*.
 
-            try:
-                os.makedirs(run_dir)
-            except FileExistsError:
+        :rtype: tuple(expected, p10, p90)
+        """
+        return tuple(progress + value for value in self.remaining[idx])
+
+
+class CommandServer:
+    """
+    Receive commands from local clients over a Unix domain socket.
+
+    Commands are newline-delimited, in the form ``COMMAND [TIMESTAMP]``, where
+    TIMESTAMP is the client ``time.time()`` when the command was issued, at
+    most MAX_DELAY milliseconds ago. Each command is acknowledged with ``ok``
+    or ``error: <reason>``.
+
+    :param path: path of the socket
+    :param loop: urwid main loop the socket is watched by
+    :param handler: called with the command and the timestamp (or None)
+    """
+    COMMANDS = ('split', 'pause', 'loading', 'skip', 'undo', 'redo', 'reset', 'save')
+    MAX_LINE = 1024
+    # Older timestamps come from a wrong clock or a stuck client, and would
+    # rewind the timer.
+    MAX_DELAY = 5000
+
+    def __init__(self, path, loop, handler):
+        self.path = path
+        self.loop = loop
+        self.handler = handler
+        self.clients = {}
+
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.setblocking(False)
+        self.socket.bind(str(path))
+        self.socket.listen()
+        self.handle = self.loop.watch_file(self.socket.fileno(), self.accept)
+
+    def accept(self):
+        try:
+            client, _ = self.socket.accept()
+        except BlockingIOError:
+            return
+
+        client.setblocking(False)
+        fd = client.fileno()
+        handle = self.loop.watch_file(fd, lambda: self.read(fd))
+        self.clients[fd] = [client, handle, b'']
+
+    def read(self, fd):
+        client, handle, buf = self.clients[fd]
+        try:
+            data = client.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+
+        if not data:
+            self.disconnect(fd)
+            return
+
+        *lines, buf = (buf + data).split(b'\n')
+        if len(buf) > self.MAX_LINE:
+            self.disconnect(fd)
+            return
+
+        self.clients[fd][2] = buf
+        for line in lines:
+            self.reply(client, self.dispatch(line.decode('utf-8', 'replace')))
+
+    def dispatch(self, line):
+        parts = line.split()
+        if not parts:
+            return None
+
+        command = parts[0].lower()
+        if command not in self.COMMANDS:
+            return f'error: unknown command {command!r}'
+
+        timestamp = None
+        if len(parts) > 1:
+            try:
+                timestamp = float(parts[1])
+            except ValueError:
+                timestamp = math.nan
+            if not math.isfinite(timestamp):
+                return f'error: invalid timestamp {parts[1]!r}'
+
+            if to_ms(time.time() - timestamp) > self.MAX_DELAY:
+                return f'error: timestamp {parts[1]!r} is more than {self.MAX_DELAY // 1000}s old'
+
+        self.handler(command, timestamp)
+        return 'ok'
+
+    def reply(self, client, message):
+        if message is None:
+            return
+
+        try:
+            client.send(message.encode('utf-8') + b'\n')
+        except OSError:
+            # Client does not read its replies, never block the timer for it.
+            pass
+
+    def disconnect(self, fd):
+        client, handle, _ = self.clients.pop(fd)
+        self.loop.remove_watch_file(handle)
+        client.close()
+
+    def close(self):
+        for fd in list(self.clients):
+            self.disconnect(fd)
+
+        self.loop.remove_watch_file(self.handle)
+        self.socket.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Broadcaster:
+    """
+    Read-only HTTP server publishing the splitter state, for stream overlays.
+
+    ``GET /state`` returns the whole state as JSON. ``GET /events`` is a
+    server-sent events stream: the whole state first, then only the keys
+    which changed, at most *rate* times per second.
+
+    The server runs its own asyncio loop in a thread, so that publishing from
+    the UI only swaps a reference. The socket is bound by :meth:`start`,
+    which raises :class:`OSError` if the address cannot be used.
+    """
+    QUEUE_SIZE = 16
+
+    def __init__(self, host, port, rate=10):
+        self.host = host
+        self.port = port
+        self.interval = 1 / rate
+        self.pending = None
+        self.published = None
+        self.state = {}
+        self.subscribers = set()
+        self.socket = None
+        self.loop = None
+        self.stopped = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.socket = socket.create_server((self.host, self.port))
+        self.port = self.socket.getsockname()[1]
+        self.loop = asyncio.new_event_loop()
+        self.stopped = asyncio.Event()
+        self.thread.start()
+
+    def stop(self):
+        if self.loop:
+            try:
+                self.loop.call_soon_threadsafe(self.stopped.set)
+            except RuntimeError:
+                # The loop has already ended.
+                pass
+        self.thread.join(1)
+
+    def publish(self, state):
+        self.pending = state
+
+    def run(self):
+        try:
+            self.loop.run_until_complete(self.serve())
+        finally:
+            self.loop.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, sock=self.socket)
+        async with server:
+            flusher = asyncio.create_task(self.flush())
+            await self.stopped.wait()
+            flusher.cancel()
+            for queue in self.subscribers:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+            await asyncio.sleep(0)
+
+    async def flush(self):
+        while True:
+            await asyncio.sleep(self.interval)
+
+            state = self.pending
+            if state is None or state is self.published:
+                continue
+
+            self.published = state
+            diff = {key: value for key, value in state.items() if key not in self.state or self.state[key] != value}
+            if not diff:
+                continue
+
+            self.state = state
+            for queue in self.subscribers:
+                try:
+                    queue.put_nowait(diff)
+                except asyncio.QueueFull:
+                    # Slow subscriber, replace its backlog by the whole state.
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(state)
+
+    async def handle(self, reader, writer):
+        try:
+            request = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()).strip():
+                pass
+
+            path = request[1] if len(request) > 1 else '/'
+            if path == '/state':
+                body = json.dumps(self.state).encode('utf-8')
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\n'
+                    b'Content-Type: application/json\r\n'
+                    b'Access-Control-Allow-Origin: *\r\n'
+                    b'Content-Length: %d\r\n\r\n' % len(body) + body
+                )
+            elif path == '/events':
+                await self.stream(writer)
+            else:
+                writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def stream(self, writer):
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: text/event-stream\r\n'
+            b'Cache-Control: no-cache\r\n'
+            b'Access-Control-Allow-Origin: *\r\n\r\n'
+        )
+        queue = asyncio.Queue(self.QUEUE_SIZE)
+        if self.state:
+            queue.put_nowait(self.state)
+        self.subscribers.add(queue)
+        try:
+            while True:
+                diff = await queue.get()
+                if diff is None:
+                    break
+                writer.write(b'data: %s\n\n' % json.dumps(diff).encode('utf-8'))
+                await writer.drain()
+        finally:
+            self.subscribers.discard(queue)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    Timing state of the splitter before an action, to undo it.
+
+    Only the segments touched by the action are saved, the others are shared
+    with the live state, so taking a snapshot does not depend on the length
+    of the route.
+    """
+    current_segment_idx: int
+    paused: bool
+    # (progress, loading_time, loading) of the timer, or None to keep the live
+    # timer, which is the case unless the action resets it.
+    timer: tuple
+    # (idx, progress_start, progress, loading_start, loading, gold,
+    # after_skip) of the touched segments
+    segments: tuple
+    # time.monotonic() when the timer was saved, to add the time elapsed
+    # since then if it was running
+    timestamp: float = None
+
+
+class Spliter:
+    # Timer resolution, in milliseconds.
+    TICK = 100
+    UNDO_LEVELS = 100
+
+    def __init__(self):
+        self.pb = None
+        self.route = None
+        self.run = None
+
+        self.view = MainWindow(self)
+        self.current_segment_idx = -1
+        self.segments = []
+        # Time of the run on the clock it is compared with, and time spent
+        # in loading screens.
+        self.clock = 'real'
+        self.progress = 0
+        self.loading_time = 0
+        self.loading = False
+        self.paused = True
+        self.comparisons = ['PB']
+        self.comparison_idx = 0
+        self.undo_stack = collections.deque(maxlen=self.UNDO_LEVELS)
+        self.redo_stack = []
+        # (sob, bpt) header totals, and the contribution of each segment to
+        # them. The PB total is the total of the comparison.
+        self.totals = (0, 0)
+        self.contributions = []
+        self.comparison_totals = [0]
+        # Segment which was current when the totals were last updated
+        self.totals_segment_idx = -1
+        self.broadcaster = None
+        self.history = None
+        self.history_loader = None
+        # Comparisons waiting for the history to be loaded
+        self.history_comparisons = []
+        self.predictor = None
+        self.profiler = None
+        self.memory_overlay = None
+        self.debug = False
+        self.pressed_key = None
+        self.pressed_key_time = None
+
+        self.loop = urwid.MainLoop(self.view, self.view.palette, unhandled_input=self.unhandled_input)
+        self.loop.screen.set_terminal_properties(colors=2**24)
+
+    @property
+    def current_segment(self):
+        if self.current_segment_idx < 0:
+            return None
+
+        return self.segments[self.current_segment_idx]
+
+    @property
+    def previous_segment(self):
+        if self.current_segment_idx < 1:
+            return None
+
+        return self.segments[self.current_segment_idx-1]
+
+    def iter_routes(self):
+        for root, _, files in os.walk('routes'):
+            for f in files:
+                if f.endswith('.yml'):
+                    yield Route.load(os.path.join(root, f))
+
+    def main(self):
+        parser = argparse.ArgumentParser(description='Offline speedrun splitter.')
+        parser.add_argument('run_dir', metavar='RUN_DIR', nargs='?')
+        parser.add_argument('run_id', metavar='RUN_ID', nargs='?')
+        parser.add_argument(
+            '-c', '--compare', action='append', default=[], metavar='RUN',
+            help="also compare against RUN: path to a run file, 'average' or 'median' of the last runs"
+        )
+        parser.add_argument(
+            '--race', metavar='RUN_DIR', nargs='+',
+            help=f'race mode, with up to {Race.MAX_RUNNERS} runners on the same route'
+        )
+        parser.add_argument(
+            '--clock', choices=CLOCKS, default='real',
+            help='compare runs with real time, or game time without loading screens (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--layout', choices=('auto', 'full', 'compact'), default='auto',
+            help='full layout, or compact one for small terminals and slow links '
+                 '(default: %(default)s, compact in terminals smaller than '
+                 f'{MainWindow.COMPACT_COLUMNS}x{MainWindow.COMPACT_ROWS})'
+        )
+        parser.add_argument(
+            '--practice', metavar='SEGMENT[:SEGMENT]',
+            help='time a segment, or a range of segments, of RUN_DIR over and over'
+        )
+        parser.add_argument(
+            '--compile-route', metavar='ROUTE', nargs='*',
+            help='compile routes (all of them by default) for a faster startup, and exit'
+        )
+        parser.add_argument(
+            '--archive', action='store_true',
+            help='pack old runs of RUN_DIR in an archive, and exit'
+        )
+        parser.add_argument(
+            '--keep', metavar='N', type=int, default=10,
+            help='with --archive, number of most recent runs to keep unpacked (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--incomplete-only', action='store_true',
+            help='with --archive, only pack runs which have not been finished'
+        )
+        parser.add_argument(
+            '--socket', metavar='PATH',
+            help='accept split/pause/loading/skip/undo/redo/reset/save commands from a Unix socket'
+        )
+        parser.add_argument(
+            '--broadcast', metavar='[HOST:]PORT',
+            help='publish the state for overlays on a local HTTP server'
+        )
+        parser.add_argument(
+            '--broadcast-rate', metavar='HZ', type=float, default=10,
+            help='maximum number of updates per second sent to overlays (default: %(default)s)'
+        )
+        Profiler.add_arguments(parser, 'offsplit.pstats')
+        args = parser.parse_args()
+
+        if args.compile_route is not None:
+            return self.compile_routes(args.compile_route)
+
+        if args.race:
+            if len(args.race) > Race.MAX_RUNNERS:
+                parser.error(f'at most {Race.MAX_RUNNERS} runners can race')
+            return Race().main(args.race)
+
+        if args.run_dir is None:
+            parser.error('the following arguments are required: RUN_DIR')
+
+        run_dir = Path(args.run_dir)
+
+        if args.archive:
+            return self.archive(run_dir, args.keep, args.incomplete_only)
+
+        if args.practice:
+            return Practice().main(run_dir, args.practice)
+
+        if not (run_dir / 'pb.yml').exists():
+            print('No runs in %s. Do you want to create it? (Y/n)' % colored(run_dir, 'yellow'), end=' ', flush=True)
+            if sys.stdin.readline().strip() in ('N', 'n'):
+                return 0
+
+            routes = []
+            for idx, r in enumerate(Route.iter_routes()):
+                print(' %s %s − %s' % (colored(idx, 'magenta'), colored(r.game, 'green'), colored(r.name, 'blue')))
+                routes.append(r)
+
+            while self.route is None:
+                print('What route do you want to use?', end=' ', flush=True)
+                i = sys.stdin.readline().strip()
+                try:
+                    self.route = routes[int(i)-1]
+                except (ValueError, TypeError):
+                    if i == 'q':
+                        return 0
+                except IndexError:
+                    continue
+
+            try:
+                os.makedirs(run_dir)
+            except FileExistsError:
                 pass
 
             self.pb = Run.from_route(run_dir / 'pb.yml', self.route)
@@ -580,7 +1911,7 @@ class Spliter:
             print('Loaded route %s − %s' % (colored(self.route.game, 'green'), colored(self.route.name, 'blue')))
 
         run_path = None
-        if len(sys.argv) < 3:
+        if args.run_id is None:
             runs = []
             for r in sorted(Run.iter_runs(run_dir), key=lambda r: r.updated):
                 if r.name == 'pb':
@@ -593,48 +1924,133 @@ class Spliter:
                 print('Enter name of the route, or new one to create it:', end=' ', flush=True)
                 run_path = sys.stdin.readline().strip()
         else:
-            run_path = sys.argv[2]
-
-        if Path(run_path).exists():
-            self.run = Run.load(run_path)
-        elif Path(run_dir / run_path).with_suffix('.yml').exists():
-            self.run = Run.load(Path(run_dir / run_path).with_suffix('.yml'))
-        elif run_path.endswith('.yml'):
-            self.run = Run.from_pb(run_path, self.pb)
-        else:
-            self.run = Run.from_pb(Path(run_dir / run_path).with_suffix('.yml'), self.pb)
+            run_path = args.run_id
 
-        self.view.run_widget.set_text(f'{self.run.path}')
+        if args.layout == 'auto':
+            cols, rows = self.loop.screen.get_cols_rows()
+            if cols < MainWindow.COMPACT_COLUMNS or rows < MainWindow.COMPACT_ROWS:
+                args.layout = 'compact'
+        if args.layout == 'compact':
+            self.view.set_compact()
+        self.clock = args.clock
 
-        progress_start = None
-        for segment in self.run.iter_segments():
-            self.segments.append(segment)
-            self.view.add_segment(segment)
+        if args.profile:
+            self.profiler = Profiler(args.profile, args.profile_memory)
+            self.profiler.start(self.loop)
 
-            if segment.duration is not None:
-                progress_start = (progress_start or 0.0) + segment.duration
+        try:
+            with self.phase('load'):
+                if Path(run_path).exists():
+                    self.run = Run.load(run_path)
+                elif Path(run_dir / run_path).with_suffix('.yml').exists():
+                    self.run = Run.load(Path(run_dir / run_path).with_suffix('.yml'))
+                elif run_path.endswith('.yml'):
+                    self.run = Run.from_pb(run_path, self.pb)
+                else:
+                    self.run = Run.from_pb(Path(run_dir / run_path).with_suffix('.yml'), self.pb)
 
-        if progress_start is not None:
-            self.progress = progress_start
+                self.view.run_widget.set_text(f'{self.run.path}')
 
-        self.view.set_enabled(False)
-        self.update()
+                progress_start = None
+                for segment in self.run.iter_segments(self.view.compact, self.clock):
+                    self.segments.append(segment)
+                    self.view.add_segment(segment)
 
-        self.loop.set_alarm_in(0.1, self.tick)
-        self.loop.run()
+                    if segment.duration is not None:
+                        progress_start = (progress_start or 0) + segment.duration
+                        self.loading_time = segment.loading
+
+                if progress_start is not None:
+                    self.progress = progress_start
+
+                for spec in args.compare:
+                    if spec in Comparison.AGGREGATES:
+                        self.history_comparisons.append(spec)
+                    else:
+                        self.add_comparison(Comparison.load(spec, self.clock))
+
+                self.history_loader = HistoryLoader(
+                    run_dir,
+                    [(segment.id, segment.comparisons[0][1] or segment.gold) for segment in self.segments],
+                    self.run.path,
+                    self.clock,
+                )
+                self.history_loader.start()
+
+                self.view.set_enabled(False)
+                self.update()
+
+            if args.broadcast:
+                host, _, port = args.broadcast.rpartition(':')
+                self.broadcaster = Broadcaster(host or 'localhost', int(port), args.broadcast_rate)
+                try:
+                    self.broadcaster.start()
+                except OSError as e:
+                    print(f'Cannot broadcast on {args.broadcast}: {e}', file=sys.stderr)
+                    return 1
+                self.update()
+
+            server = None
+            if args.socket:
+                server = CommandServer(args.socket, self.loop, self.remote_command)
+
+            self.loop.set_alarm_in(self.TICK / 1000, self.tick)
+            try:
+                with self.phase('run'):
+                    self.loop.run()
+            finally:
+                if server:
+                    server.close()
+                if self.broadcaster:
+                    self.broadcaster.stop()
+        finally:
+            if self.profiler:
+                self.profiler.stop()
+                print(f'Profile saved in {self.profiler.path}', file=sys.stderr)
+
+        return 0
+
+    def compile_routes(self, paths):
+        routes = [Route.load(path) for path in paths] if paths else Route.iter_routes()
+        for route in routes:
+            route.save_bundle()
+            print('Compiled %s − %s in %s' % (colored(route.game, 'green'), colored(route.name, 'blue'), route.bundle_path))
 
         return 0
 
+    def archive(self, run_dir, keep, incomplete_only):
+        runs = sorted((r for r in Run.iter_runs(run_dir) if r.name != 'pb'), key=lambda r: r.updated)
+        runs = runs[:-keep] if keep > 0 else runs
+        if incomplete_only:
+            runs = [r for r in runs if not r.complete]
+
+        if not runs:
+            print('Nothing to archive')
+            return 0
+
+        archive = Archive(run_dir)
+        archive.add(runs)
+        print('%s runs archived in %s' % (colored(len(runs), 'magenta'), colored(archive.path / Archive.PATH, 'yellow')))
+        return 0
+
     def tick(self, loop=None, user_data=None):
         try:
-            # blink golds
-            ts = time.time()
-            h = 0.125
-            s = 0.59
-            v = 1 - 0.7 * abs(0.5 - (ts % 1))
-            color = '#' + ''.join('%02x' % int(i * 255) for i in colorsys.hsv_to_rgb(h, s, v))
-            self.loop.screen.register_palette_entry('gold', 'yellow', 'black', '', color, '#2f3542')
-            self.loop.screen.clear()
+            # blink golds, which redraws the whole screen: not in the compact
+            # layout.
+            if not self.view.compact:
+                ts = time.time()
+                h = 0.125
+                s = 0.59
+                v = 1 - 0.7 * abs(0.5 - (ts % 1))
+                color = '#' + ''.join('%02x' % int(i * 255) for i in colorsys.hsv_to_rgb(h, s, v))
+                self.loop.screen.register_palette_entry('gold', 'yellow', 'black', '', color, '#2f3542')
+                self.loop.screen.clear()
+
+            if self.memory_overlay is not None:
+                self.update_memory_overlay()
+
+            if self.history_loader:
+                self.poll_history()
 
             # reset display of pressed key after 0.1s
             if self.pressed_key and self.pressed_key_time + 0.1 < time.time():
@@ -644,13 +2060,118 @@ class Spliter:
             if self.paused:
                 return
 
-            self.progress += 0.1
-            if self.current_segment:
-                self.current_segment.progress = self.progress
-
+            self.advance(self.TICK)
             self.update()
         finally:
-            self.loop.set_alarm_in(0.1, self.tick)
+            self.loop.set_alarm_in(self.TICK / 1000, self.tick)
+
+    def advance(self, elapsed):
+        """
+        Run the timer for *elapsed* milliseconds, unless it is paused. In a
+        loading screen, they are added to the loading time instead of the game
+        time.
+        """
+        if self.paused:
+            return
+
+        if self.loading:
+            self.loading_time += elapsed
+        if not self.loading or self.clock == 'real':
+            self.progress += elapsed
+        if self.current_segment:
+            self.current_segment.progress = self.progress
+            self.current_segment.loading = self.loading_time
+
+    def get_times(self):
+        """
+        Real and game times of the run.
+
+        :rtype: dict
+        """
+        if self.clock == 'game':
+            return {'real': self.progress + self.loading_time, 'game': self.progress}
+
+        return {'real': self.progress, 'game': self.progress - self.loading_time}
+
+    def get_seg_durations(self, segment):
+        """
+        Real and game durations of a segment.
+
+        :rtype: dict
+        """
+        duration = segment.duration
+        if duration is None:
+            return {'real': None, 'game': None}
+
+        if self.clock == 'game':
+            return {'real': duration + segment.loading_duration, 'game': duration}
+
+        return {'real': duration, 'game': duration - segment.loading_duration}
+
+    def phase(self, name):
+        if not self.profiler:
+            return contextlib.nullcontext()
+
+        return self.profiler.phase(name)
+
+    def poll_history(self):
+        """
+        Pick up the history once the :class:`HistoryLoader` is done.
+        """
+        try:
+            result = self.history_loader.results.get_nowait()
+        except queue.Empty:
+            return
+
+        errors = self.history_loader.errors
+        self.history_loader = None
+        if isinstance(result, Exception):
+            self.view.error(f'Unable to load the history: {result}')
+            return
+
+        self.history, self.predictor = result
+        for idx, segment in enumerate(self.segments):
+            segment.set_history(self.history.get_last(idx), self.history.sparklines[idx])
+            if segment.duration is not None:
+                segment.update(current=idx == self.current_segment_idx)
+        for name in self.history_comparisons:
+            self.add_comparison(Comparison.from_history(name, self.history))
+        self.history_comparisons = []
+
+        if errors:
+            self.view.error(f'History of {self.history.runs} runs loaded, {len(errors)} malformed runs skipped')
+        else:
+            self.view.message(f'History of {self.history.runs} runs loaded')
+        self.update()
+
+    def get_history_deltas(self):
+        """
+        Duration of the last split segment against its average and the last
+        attempt, and reset rate of the current segment.
+        """
+        if not self.history or not self.current_segment:
+            return None
+
+        idx = self.current_segment_idx
+        average = last = None
+        if self.previous_segment and self.previous_segment.duration is not None:
+            duration = self.previous_segment.duration
+            if self.history.averages[idx - 1] is not None:
+                average = duration - self.history.averages[idx - 1]
+            if self.history.last[idx - 1] is not None:
+                last = duration - self.history.last[idx - 1]
+
+        return average, last, self.history.reset_rates[idx]
+
+    def update_memory_overlay(self):
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        self.view.message(
+            f'mem {current / 1024:.0f} KiB  '
+            f'net {(current - self.memory_overlay) / 1024:+.1f} KiB/tick  '
+            f'peak {(peak - self.memory_overlay) / 1024:+.1f} KiB/tick'
+        )
+        self.memory_overlay = current
 
     def update(self):
         if self.current_segment:
@@ -660,7 +2181,7 @@ class Spliter:
             color = 'header'
         elif self.paused:
             color = 'header paused'
-        elif self.previous_segment and self.previous_segment.pb is not None and self.previous_segment.progress > self.previous_segment.pb_start + self.previous_segment.pb:
+        elif self.previous_segment and self.previous_segment.pb is not None and self.previous_segment.progress is not None and self.previous_segment.progress > self.previous_segment.pb_start + self.previous_segment.pb:
             color = 'header red'
         elif self.current_segment:
             if self.current_segment.pb is not None and self.current_segment.progress > self.current_segment.pb_start + self.current_segment.pb:
@@ -672,25 +2193,103 @@ class Spliter:
 
         self.view.header.set_attr_map({None: color})
 
-        sob = 0.0
-        bpt = 0.0
-        pb = 0.0
-        for segment in self.segments:
-            sob += min(segment.duration if segment.duration is not None and segment != self.current_segment else (segment.gold or 0.0), segment.gold or 0.0)
-            if segment == self.current_segment:
-                bpt += max(segment.duration if segment.duration is not None else (segment.gold or 0.0), segment.gold or 0.0)
-            elif segment.duration is not None:
-                bpt += segment.duration
-            else:
-                bpt += segment.gold or 0.0
-            pb += segment.pb or 0.0
+        if len(self.contributions) != len(self.segments):
+            self.refresh_totals()
+        else:
+            # Only the current segment changes on each tick, and the previous
+            # one when it has just been split.
+            self.refresh_totals({self.totals_segment_idx, self.current_segment_idx} - {-1})
+        self.totals_segment_idx = self.current_segment_idx
+        sob, bpt = self.totals
+        pb = self.comparison_totals[self.comparison_idx]
+
+        prediction = self.get_prediction()
+        if self.view.compact:
+            self.update_compact_header(color, sob, bpt, pb, prediction)
+        else:
+            self.update_header(color, sob, bpt, pb, prediction)
+
+        if self.broadcaster:
+            self.broadcaster.publish({
+                'route': f'{self.route.game} – {self.route.name}',
+                'timer': self.progress,
+                'clock': self.clock,
+                'times': self.get_times(),
+                'paused': self.paused,
+                'loading': self.loading,
+                'segment': self.current_segment.name if self.current_segment else None,
+                'comparison': self.comparisons[self.comparison_idx],
+                'deltas': {
+                    name: self.previous_segment.get_delta(idx) if self.previous_segment else None
+                    for idx, name in enumerate(self.comparisons)
+                },
+                'sob': sob,
+                'bpt': bpt,
+                'pb': pb,
+                'prediction': prediction,
+            })
+
+        if self.view.compact:
+            return
+
+        text = []
+        for key, func in self.keys.items():
+            doc = func.__doc__ or ''
+            if not doc:
+                continue
+
+            color = 'footer key'
+            if self.pressed_key == key:
+                color += ' active'
+
+            if key == ' ':
+                key = 'SPACE'
+
+            text.append((color, key.upper()))
+            text.append('\xa0')
+            text.append((doc).strip().replace(' ', '\xa0'))
+            text.append(' ')
+
+        self.view.keys_widget.set_text(text)
 
-        text = ['\n', '\n']
+    def update_header(self, color, sob, bpt, pb, prediction):
+        other = CLOCKS[1 - CLOCKS.index(self.clock)]
+        text = ['\n']
+        text.append(f'{other.capitalize()} time:          ')
+        text.append(get_timer_display(self.get_times()[other], color))
+        if self.loading:
+            text.append('  loading')
+        text.append('\n')
         text.append('Sum of Best:        ')
         text.append(get_timer_display(sob, color))
         text.append('\n')
         text.append('Best Possible Time: ')
         text.append(get_timer_display(bpt, color))
+        if len(self.comparisons) > 1 and self.previous_segment:
+            text.append('\n')
+            for idx, name in enumerate(self.comparisons):
+                text.append(f'{name}: ')
+                text.append(get_timer_display(self.previous_segment.get_delta(idx), color, sign=True))
+                text.append('  ')
+        if prediction:
+            text.append('\n')
+            text.append('Prediction:         ')
+            text.append(get_timer_display(prediction[0], color))
+            text.append(' (')
+            text.append(get_timer_display(prediction[1], color))
+            text.append(' – ')
+            text.append(get_timer_display(prediction[2], color))
+            text.append(')')
+        deltas = self.get_history_deltas()
+        if deltas:
+            average, last, reset_rate = deltas
+            text.append('\n')
+            text.append('Average: ')
+            text.append(get_timer_display(average, color, sign=True))
+            text.append('  Last: ')
+            text.append(get_timer_display(last, color, sign=True))
+            text.append('  Resets: ')
+            text.append('-' if reset_rate is None else f'{reset_rate:.0%}')
         self.view.stats.set_text(text)
 
         self.view.timer.set_text(get_big_timer(self.progress))
@@ -700,34 +2299,113 @@ class Spliter:
                 f'{self.route.game} – {self.route.name}',
                 '\n',
                 '\n',
-                'PB: ', get_timer_display(pb, color),
+                f'{self.comparisons[self.comparison_idx]}: ', get_timer_display(pb, color),
                 '\n',
                 self.pb.created.strftime('%Y-%m-%d %H:%M') if self.pb.created else ''
             ]
         )
 
-        text = []
-        for key, func in self.keys.items():
-            doc = func.__doc__ or ''
-            if not doc:
-                continue
+    def update_compact_header(self, color, sob, bpt, pb, prediction):
+        text = [
+            f'{self.comparisons[self.comparison_idx]} ', get_timer_display(pb, color),
+            '  SoB ', get_timer_display(sob, color),
+            '  BPT ', get_timer_display(bpt, color),
+        ]
+        if len(self.comparisons) > 1 and self.previous_segment:
+            for idx, name in enumerate(self.comparisons):
+                text.append(f'  {name} ')
+                text.append(get_timer_display(self.previous_segment.get_delta(idx), color, sign=True))
+        if prediction:
+            text.append('  Pred ')
+            text.append(get_timer_display(prediction[0], color))
+        deltas = self.get_history_deltas()
+        if deltas and deltas[0] is not None:
+            text.append('  Avg ')
+            text.append(get_timer_display(deltas[0], color, sign=True))
+        if self.loading:
+            text.append('  loading')
+        self.view.stats.set_text(text)
+        self.view.timer.set_text(get_time_str(self.progress))
 
-            color = 'footer key'
-            if self.pressed_key == key:
-                color += ' active'
+    def get_contribution(self, segment):
+        """
+        Contribution of a segment to the (sob, bpt) header totals.
+        """
+        gold = segment.gold or 0
+        if segment == self.current_segment:
+            sob = gold
+            bpt = max(segment.duration if segment.duration is not None else gold, gold)
+        elif segment.duration is not None:
+            sob = min(segment.duration, gold)
+            bpt = segment.duration
+        else:
+            sob = bpt = gold
 
-            if key == ' ':
-                key = 'SPACE'
+        return (sob, bpt)
 
-            text.append((color, key.upper()))
-            text.append('\xa0')
-            text.append((doc).strip().replace(' ', '\xa0'))
-            text.append(' ')
+    def refresh_totals(self, idxs=None):
+        """
+        Update the header totals with the contribution of some segments, or
+        recompute them from all segments.
 
-        self.view.keys_widget.set_text(text)
+        The comparison totals do not change during the run, they are only
+        recomputed with the others.
+        """
+        if idxs is None:
+            self.contributions = [self.get_contribution(segment) for segment in self.segments]
+            self.totals = tuple(map(sum, zip((0, 0), *self.contributions)))
+            self.comparison_totals = [
+                sum(segment.comparisons[idx][1] or 0 for segment in self.segments)
+                for idx in range(len(self.comparisons))
+            ]
+            return
+
+        totals = list(self.totals)
+        for idx in idxs:
+            old = self.contributions[idx]
+            new = self.contributions[idx] = self.get_contribution(self.segments[idx])
+            for i in range(2):
+                totals[i] += new[i] - old[i]
+        self.totals = tuple(totals)
+
+    def get_prediction(self):
+        """
+        Predicted final time, as of the last split.
+        """
+        if not self.predictor:
+            return None
+
+        if not self.current_segment:
+            return self.predictor.predict(0, 0)
+
+        return self.predictor.predict(self.current_segment_idx, self.current_segment.progress_start)
+
+    def add_comparison(self, comparison):
+        total = 0
+        for segment, split in zip(self.segments, comparison.iter_splits(self.segments)):
+            segment.comparisons.append(split)
+            total += split[1] or 0
+
+        self.comparisons.append(comparison.name)
+        self.comparison_totals.append(total)
+
+    def go_next_segment(self, progress=None, loading=None):
+        """
+        Split the current segment and go to the next one.
+
+        :param progress: time of the split, if not now
+        :type progress: int
+        :param loading: loading time of the split, if not now
+        :type loading: int
+        """
+        if progress is None:
+            progress = self.progress
+        if loading is None:
+            loading = self.loading_time
 
-    def go_next_segment(self):
         if self.current_segment:
+            self.current_segment.progress = progress
+            self.current_segment.loading = loading
             self.current_segment.stop()
 
         self.current_segment_idx += 1
@@ -736,30 +2414,42 @@ class Spliter:
             self.stop()
             return False
 
-        self.current_segment.progress_start = self.progress
+        self.current_segment.progress_start = progress
         self.current_segment.progress = self.progress
+        self.current_segment.loading_start = loading
+        self.current_segment.loading = self.loading_time
 
         return True
 
     def reset(self):
         """reset"""
+        idxs = self.get_started_segments()
+        if idxs:
+            self.checkpoint(idxs, reset=True)
+        self._reset()
+
+    def _reset(self):
         self.paused = True
         for segment in self.segments:
             segment.reset()
             segment.update(current=False)
         self.stop()
-        self.progress = 0.0
+        self.progress = 0
+        self.loading_time = 0
+        self.loading = False
+        self.refresh_totals()
         self.update()
 
     def start(self):
-        self.reset()
+        self._reset()
 
         self.view.set_enabled(True)
         self.paused = False
-        self.progress = 0.0
+        self.progress = 0
         self.current_segment_idx = 0
-        self.current_segment.progress = 0.0
-        self.current_segment.progress_start = 0.0
+        self.current_segment.progress = 0
+        self.current_segment.progress_start = 0
+        self.current_segment.loading = self.current_segment.loading_start = 0
         self.update()
 
     def resume_segment(self, idx):
@@ -771,7 +2461,7 @@ class Spliter:
 
     def resume(self):
         """resume"""
-        progress = 0.0
+        progress = 0
         for idx, segment in enumerate(self.segments):
             if segment.duration is None:
                 self.resume_segment(idx)
@@ -791,73 +2481,283 @@ class Spliter:
         self.view.set_enabled(True)
 
         if self.current_segment_idx >= 0:
-            self.view.listbox.set_focus(self.current_segment_idx*2, 'above')
-            self.view.listbox.set_focus_valign('middle')
+            self.view.set_focus(self.current_segment_idx)
 
-    def pause(self):
+    def pause(self, delay=0):
         """pause"""
         if not self.current_segment:
             self.pressed_key = None
             return
 
+        self.checkpoint([])
         self.paused = not self.paused
+        if delay:
+            # Time elapsed since the command was issued belongs to the
+            # opposite state.
+            if self.paused:
+                progress, self.loading_time = self.rewind(delay)
+                self.progress = max(self.current_segment.progress_start, progress)
+                self.current_segment.progress = self.progress
+                self.current_segment.loading = self.loading_time
+            else:
+                self.advance(delay)
 
         self.update()
 
-    def split(self):
+    def rewind(self, delay):
+        """
+        Time and loading time of the running timer *delay* milliseconds ago.
+
+        Time elapsed in a loading screen is loading time, which does not count
+        in game time.
+
+        :rtype: tuple(progress, loading_time)
+        """
+        shift = min(delay, self.current_segment.loading_duration) if self.loading else 0
+        return self.progress - (delay if self.clock == 'real' else delay - shift), self.loading_time - shift
+
+    def toggle_loading(self, delay=0):
+        """loading"""
+        if not self.current_segment:
+            self.pressed_key = None
+            return
+
+        self.loading = not self.loading
+        if delay and not self.paused:
+            # Time elapsed since the command was issued belongs to the new
+            # state: move it between the game time and the loading time of
+            # the segment.
+            if self.loading:
+                shift = min(delay, self.get_seg_durations(self.current_segment)['game'])
+            else:
+                shift = -min(delay, self.current_segment.loading_duration)
+            self.loading_time += shift
+            self.current_segment.loading = self.loading_time
+            if self.clock == 'game':
+                self.progress -= shift
+                self.current_segment.progress = self.progress
+
+        self.update()
+
+    def split(self, delay=0):
         """start/split"""
         if not self.current_segment:
+            self.checkpoint(sorted(set(self.get_started_segments()) | {0}), reset=True)
             self.start()
-        elif not self.go_next_segment():
+            self.progress = self.current_segment.progress = delay
+        else:
+            self.checkpoint(self.get_split_segments())
+            progress, loading = self.rewind(delay if not self.paused else 0)
+            if not self.go_next_segment(max(self.current_segment.progress_start, progress), loading):
+                return
+
+        self.focus()
+
+    def skip(self):
+        """skip"""
+        if not self.current_segment:
             return
+        if self.current_segment_idx == len(self.segments) - 1:
+            self.view.error('The last segment cannot be skipped')
+            return
+
+        self.checkpoint(self.get_split_segments())
+        progress_start = self.current_segment.progress_start
+        loading_start = self.current_segment.loading_start
+        self.current_segment.progress = self.current_segment.progress_start = None
+        self.current_segment.loading = self.current_segment.loading_start = None
+        self.current_segment.stop()
 
+        # The next segment is timed from the start of the skipped one.
+        self.current_segment_idx += 1
+        self.current_segment.progress_start = progress_start
+        self.current_segment.progress = self.progress
+        self.current_segment.loading_start = loading_start
+        self.current_segment.loading = self.loading_time
+        self.current_segment.after_skip = True
         self.focus()
 
+    def get_started_segments(self):
+        """
+        Indexes of the segments with a time, which a reset changes.
+        """
+        return [
+            idx for idx, segment in enumerate(self.segments)
+            if segment.progress is not None or segment.progress_start is not None
+        ]
+
+    def get_split_segments(self):
+        """
+        Indexes of the segments changed by splitting the current one.
+        """
+        return [idx for idx in (self.current_segment_idx, self.current_segment_idx + 1) if idx < len(self.segments)]
+
+    def take_snapshot(self, idxs, reset=False):
+        return Snapshot(
+            self.current_segment_idx,
+            self.paused,
+            (self.progress, self.loading_time, self.loading) if reset else None,
+            tuple(
+                (
+                    idx, segment.progress_start, segment.progress, segment.loading_start, segment.loading,
+                    segment.gold, segment.after_skip,
+                )
+                for idx, segment in ((idx, self.segments[idx]) for idx in idxs)
+            ),
+            time.monotonic() if reset else None,
+        )
+
+    def checkpoint(self, idxs, reset=False):
+        """
+        Save the state of segments before an action, to undo it.
+
+        :param idxs: indexes of the segments the action changes
+        :param reset: if True, the action also resets the timer
+        """
+        self.undo_stack.append(self.take_snapshot(idxs, reset))
+        self.redo_stack.clear()
+
+    def restore(self, snapshot):
+        """
+        Restore a snapshot, and return the snapshot to go back to the current
+        state.
+        """
+        idxs = [idx for idx, *_ in snapshot.segments]
+        back = self.take_snapshot(idxs, snapshot.timer is not None)
+
+        for idx, progress_start, progress, loading_start, loading, gold, after_skip in snapshot.segments:
+            segment = self.segments[idx]
+            segment.progress_start = progress_start
+            segment.progress = progress
+            segment.loading_start = loading_start
+            segment.loading = loading
+            segment.gold = gold
+            segment.after_skip = after_skip
+        self.current_segment_idx = snapshot.current_segment_idx
+        self.paused = snapshot.paused
+        if snapshot.timer is not None:
+            self.progress, self.loading_time, self.loading = snapshot.timer
+            # The run went on since the reset.
+            self.advance(to_ms(time.monotonic() - snapshot.timestamp))
+        if self.current_segment:
+            self.current_segment.progress = self.progress
+            self.current_segment.loading = self.loading_time
+
+        for idx in idxs:
+            self.segments[idx].update(current=idx == self.current_segment_idx)
+        self.refresh_totals(idxs)
+        if self.current_segment:
+            self.focus()
+        else:
+            self.view.set_enabled(False)
+
+        return back
+
+    def undo(self):
+        """undo"""
+        if not self.undo_stack:
+            self.view.error('Nothing to undo')
+            return
+
+        self.redo_stack.append(self.restore(self.undo_stack.pop()))
+
+    def redo(self):
+        """redo"""
+        if not self.redo_stack:
+            self.view.error('Nothing to redo')
+            return
+
+        self.undo_stack.append(self.restore(self.redo_stack.pop()))
+
     def save_run(self):
         """save run"""
+        with self.phase('save'):
+            self._save_run()
+
+    def _save_run(self):
         self.run.updated = datetime.now()
-        self.run.segs = {
-            segment.id: {
-                'duration': segment.duration,
-                'pb': segment.pb,
-                'gold': segment.gold,
-            }
-            for segment in self.segments
-        }
+        segs = {}
+        for segment in self.segments:
+            # PB and gold of the other clock are kept from the run file.
+            seg = {'pb': None, 'gold': None}
+            seg.update(self.run.segs.get(segment.id, {}))
+            for clock, duration in self.get_seg_durations(segment).items():
+                seg[get_seg_key('duration', clock)] = duration
+            seg[get_seg_key('pb', self.clock)] = segment.comparisons[0][1]
+            seg[get_seg_key('gold', self.clock)] = segment.gold
+            segs[segment.id] = seg
+        self.run.segs = segs
         self.run.save()
         self.view.message(f'Run saved in {self.run.path}')
 
     def save_pb(self):
         """save PB"""
+        with self.phase('save'):
+            self._save_pb()
+
+    def _save_pb(self):
         self.pb.created = datetime.now()
         self.pb.updated = datetime.now()
-        self.pb.segs = {
-            segment.id:
-            {
-                'duration': segment.duration,
-                'pb': segment.pb,
-                'gold': segment.duration if segment != self.current_segment and segment.duration and (segment.gold is None or segment.duration < segment.gold) else segment.gold,
-            }
-            for segment in self.segments
-        }
+        segs = {}
+        for segment in self.segments:
+            old = self.pb.segs.get(segment.id, {})
+            seg = {}
+            for clock, duration in self.get_seg_durations(segment).items():
+                if clock == self.clock:
+                    pb, gold = segment.comparisons[0][1], segment.gold
+                else:
+                    pb, gold = get_seg_time(old, 'duration', clock), get_seg_time(old, 'gold', clock)
+                if segment != self.current_segment and duration and not segment.after_skip and (gold is None or duration < gold):
+                    gold = duration
+                seg[get_seg_key('duration', clock)] = duration
+                seg[get_seg_key('pb', clock)] = pb
+                seg[get_seg_key('gold', clock)] = gold
+            segs[segment.id] = seg
+        self.pb.segs = segs
         self.pb.save()
         self.view.message(f'PB saved in {self.pb.path}')
 
     def save_golds(self):
         """save golds"""
+        with self.phase('save'):
+            self._save_golds()
+
+    def _save_golds(self):
         self.pb.updated = datetime.now()
         for segment in self.segments:
-            gold = self.pb.segs[segment.id]['gold']
-            if segment.duration and (gold is None or segment.duration < gold):
-                self.pb.segs[segment.id]['gold'] = segment.duration
+            seg = self.pb.segs[segment.id]
+            for clock, duration in self.get_seg_durations(segment).items():
+                gold = get_seg_time(seg, 'gold', clock)
+                if duration and not segment.after_skip and (gold is None or duration < gold):
+                    seg[get_seg_key('gold', clock)] = duration
 
         self.pb.save()
         self.view.message(f'Golds saved in {self.pb.path}')
 
+    def switch_comparison(self):
+        """compare"""
+        self.comparison_idx = (self.comparison_idx + 1) % len(self.comparisons)
+        for segment in self.segments:
+            segment.set_comparison(self.comparison_idx)
+        if self.current_segment:
+            self.current_segment.update()
+
+        self.view.message(f'Comparing against {self.comparisons[self.comparison_idx]}')
+
     def quit(self):
         """quit"""
         raise urwid.ExitMainLoop()
 
+    def toggle_memory_overlay(self):
+        if self.memory_overlay is not None:
+            self.memory_overlay = None
+            self.view.message('')
+            return
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.memory_overlay = tracemalloc.get_traced_memory()[0]
+
     def toggle_debug(self):
         self.debug = not self.debug
 
@@ -870,15 +2770,48 @@ class Spliter:
     keys = {
         'enter': split,
         ' ': pause,
+        'l': toggle_loading,
+        'k': skip,
+        'u': undo,
+        'y': redo,
         'r': reset,
         's': save_run,
         'p': save_pb,
         'g': save_golds,
         'b': resume,
+        'c': switch_comparison,
         'q': quit,
         'd': toggle_debug,
+        'm': toggle_memory_overlay,
     }
 
+    def remote_command(self, command, timestamp):
+        """
+        Handle a command received by the :class:`CommandServer`.
+        """
+        delay = 0
+        if timestamp is not None:
+            delay = max(0, to_ms(time.time() - timestamp))
+
+        if command == 'split':
+            self.split(delay)
+        elif command == 'pause':
+            self.pause(delay)
+        elif command == 'loading':
+            self.toggle_loading(delay)
+        elif command == 'skip':
+            self.skip()
+        elif command == 'undo':
+            self.undo()
+        elif command == 'redo':
+            self.redo()
+        elif command == 'reset':
+            self.reset()
+        elif command == 'save':
+            self.save_run()
+
+        self.update()
+
     def unhandled_input(self, k):
         if isinstance(k, tuple):
             # do not handle pointer
@@ -894,8 +2827,496 @@ class Spliter:
         self.update()
 
 
+class Runner:
+    """
+    A runner of a race.
+
+    Unlike :class:`Segment`, it does not have a widget per segment, only the
+    list of its split times.
+
+    :param run_dir: runs directory of the runner
+    :param pb: PB of the runner
+    :param route: route of the race
+    """
+
+    def __init__(self, run_dir, pb, route):
+        self.run_dir = Path(run_dir)
+        self.name = self.run_dir.parent.name or self.run_dir.name
+        self.pb = pb
+        self.route = route
+        # Time of every split since the start of the race
+        self.splits = []
+
+        # Time of the PB splits, or None if it has no time for a segment.
+        self.pb_splits = []
+        total = 0
+        for seg in route.route:
+            duration = pb.segs.get(seg['id'], {}).get('duration')
+            if duration is None:
+                total = None
+            elif total is not None:
+                total += duration
+            self.pb_splits.append(total)
+
+        self.widget = MarkupText('', align='center')
+
+    @property
+    def finished(self):
+        return len(self.splits) >= len(self.route.route)
+
+    def split(self, progress):
+        if self.finished:
+            return False
+
+        self.splits.append(progress)
+        return True
+
+    def save(self, name):
+        segs = {}
+        previous = 0
+        for idx, seg in enumerate(self.route.route):
+            pb_seg = self.pb.segs.get(seg['id'], {})
+            duration = None
+            if idx < len(self.splits):
+                duration = self.splits[idx] - previous
+                previous = self.splits[idx]
+            segs[seg['id']] = {'duration': duration, 'pb': pb_seg.get('duration'), 'gold': pb_seg.get('gold')}
+
+        run = Run(self.run_dir / f'{name}.yml', self.pb.route, datetime.now(), datetime.now(), segs)
+        run.save()
+        return run
+
+    def update(self, key, leader):
+        """
+        Update the column of the runner.
+
+        :param key: key to split
+        :param leader: runner ahead of everyone
+        """
+        idx = len(self.splits)
+        text = [('footer key', f' {key} '), ' ', ('hilight', self.name), '\n']
+        if self.finished:
+            text.append(('gold' if self is leader else 'normal', 'Finished'))
+        else:
+            text.append(self.route.route[idx]['name'])
+        text.append(f' {idx}/{len(self.route.route)}\n')
+
+        if not self.splits:
+            text.append('-\n-')
+        else:
+            if self is leader:
+                text.append(('gold', 'Leader'))
+            else:
+                delta = self.splits[-1] - leader.splits[idx - 1]
+                text.append(get_timer_display(delta, 'behind loss' if delta > 0 else 'ahead gain', sign=True))
+            text.append('\n')
+
+            pb = self.pb_splits[idx - 1]
+            if pb is None:
+                text.append('PB -')
+            else:
+                delta = self.splits[-1] - pb
+                text.append('PB ')
+                text.append(get_timer_display(delta, 'behind loss' if delta > 0 else 'ahead gain', sign=True))
+
+        self.widget.set_text(text)
+
+
+class TimerWindow(urwid.WidgetWrap):
+    """
+    Window with a title and a big timer in the header, and a message in the
+    footer.
+
+    :param title: second line of the title, under the route
+    :param body: flow widget, at the top of the window
+    """
+
+    def __init__(self, route, title, body):
+        self.title = MarkupText(f'\n{route.game} – {route.name}\n\n{title}', align='center')
+        self.timer = MarkupText('', align='right')
+        self.header = urwid.AttrMap(urwid.Columns([self.title, self.timer]), 'header')
+        self.message_widget = MarkupText('', align='center')
+        self.view = urwid.Frame(
+            urwid.Filler(body, valign='top'),
+            header=self.header,
+            footer=urwid.AttrMap(self.message_widget, 'footer'),
+        )
+        self.view = urwid.AttrMap(self.view, 'body')
+
+        super().__init__(self.view)
+
+    def message(self, message, color='footer msg'):
+        self.message_widget.set_text((color, message))
+
+
+class TimerApp:
+    """
+    Single timer in a :class:`TimerWindow`, for the modes which do not need
+    the whole splitter.
+
+    The timer is the only widget updated on each tick. Subclasses set
+    :attr:`view` before calling :meth:`run`, and handle their own keys in
+    :meth:`handle_key`.
+    """
+    TICK = Spliter.TICK
+
+    def __init__(self):
+        self.route = None
+        self.view = None
+        self.loop = None
+        self.progress = 0
+        self.started = False
+        self.paused = True
+
+    def run(self):
+        self.loop = urwid.MainLoop(self.view, MainWindow.palette, unhandled_input=self.unhandled_input)
+        self.loop.screen.set_terminal_properties(colors=2**24)
+
+        self.update()
+        self.loop.set_alarm_in(self.TICK / 1000, self.tick)
+        self.loop.run()
+
+    def tick(self, loop=None, user_data=None):
+        try:
+            if self.paused:
+                return
+
+            self.progress += self.TICK
+            self.update()
+        finally:
+            self.loop.set_alarm_in(self.TICK / 1000, self.tick)
+
+    def get_color(self):
+        """
+        Color of the header while the timer runs.
+        """
+        return 'header green'
+
+    def update(self):
+        if not self.started:
+            color = 'header'
+        elif self.paused:
+            color = 'header paused'
+        else:
+            color = self.get_color()
+        self.view.header.set_attr_map({None: color})
+        self.view.timer.set_text(get_big_timer(self.progress))
+
+    def reset(self):
+        raise NotImplementedError
+
+    def handle_key(self, k):
+        pass
+
+    def unhandled_input(self, k):
+        if isinstance(k, tuple):
+            return
+
+        if k == ' ' and self.started:
+            self.paused = not self.paused
+        elif k == 'r':
+            self.reset()
+        elif k == 'q':
+            raise urwid.ExitMainLoop()
+        else:
+            self.handle_key(k)
+
+        self.update()
+
+
+class RaceWindow(TimerWindow):
+    def __init__(self, route, runners):
+        self.runners = urwid.Columns(
+            [urwid.LineBox(runner.widget) for runner in runners],
+            dividechars=1,
+        )
+        super().__init__(route, 'Race', self.runners)
+
+
+class Race(TimerApp):
+    """
+    Several runners on the same route, sharing the same timer and the same
+    render loop.
+
+    Runner columns are only updated on splits.
+    """
+    MAX_RUNNERS = 8
+
+    def __init__(self):
+        super().__init__()
+        self.runners = []
+
+    def main(self, run_dirs):
+        for run_dir in run_dirs:
+            pb = Run.load(Path(run_dir) / 'pb.yml')
+            if self.route is None:
+                self.route = pb.get_route()
+            elif pb.route != self.route.path:
+                print(f'{run_dir} is not on the route {self.route.path}', file=sys.stderr)
+                return 1
+
+            self.runners.append(Runner(run_dir, pb, self.route))
+
+        self.view = RaceWindow(self.route, self.runners)
+        self.update_runners()
+        self.run()
+        return 0
+
+    @property
+    def leader(self):
+        """
+        Runner with the most splits, and the earliest last split.
+        """
+        return min(self.runners, key=lambda r: (-len(r.splits), r.splits[-1] if r.splits else 0))
+
+    def update_runners(self):
+        leader = self.leader
+        for idx, runner in enumerate(self.runners):
+            runner.update(str(idx + 1), leader)
+
+    def start(self):
+        self.reset()
+        self.started = True
+        self.paused = False
+        self.view.message('Go!')
+
+    def reset(self):
+        self.started = False
+        self.paused = True
+        self.progress = 0
+        for runner in self.runners:
+            runner.splits = []
+        self.update_runners()
+
+    def split(self, runner):
+        if not self.started or self.paused or not runner.split(self.progress):
+            return
+
+        self.update_runners()
+        if all(r.finished for r in self.runners):
+            self.paused = True
+            self.view.message(f'GG {self.leader.name}!')
+
+    def save(self):
+        name = datetime.now().strftime('race-%Y%m%d-%H%M')
+        for runner in self.runners:
+            runner.save(name)
+        self.view.message(f'Runs saved as {name}')
+
+    def handle_key(self, k):
+        if k == 'enter':
+            # Runners press it by habit to split, it must not restart a race.
+            if not self.started:
+                self.start()
+        elif k == 's':
+            self.save()
+        elif k.isdigit() and 1 <= int(k) <= len(self.runners):
+            self.split(self.runners[int(k) - 1])
+
+
+class PracticeWindow(TimerWindow):
+    def __init__(self, route, segments):
+        if len(segments) == 1:
+            practice = segments[0]['name']
+        else:
+            practice = f"{segments[0]['name']} → {segments[-1]['name']}"
+        self.segment_rows = [
+            (MarkupText(seg['name']), MarkupText('', align='right'), MarkupText('', align='right'))
+            for seg in segments
+        ]
+        self.stats = MarkupText('')
+        table_head = urwid.AttrMap(urwid.Columns([
+            urwid.Text('Segment'),
+            urwid.Text('Last', align='right'),
+            urwid.Text('Gold', align='right'),
+        ], dividechars=2), 'table head')
+        super().__init__(route, f'Practice: {practice}', urwid.Pile(
+            [table_head] +
+            [urwid.Columns(row, dividechars=2) for row in self.segment_rows] +
+            [urwid.Divider('─'), self.stats]
+        ))
+
+
+class Practice(TimerApp):
+    """
+    Time a segment, or a range of segments, over and over.
+
+    Only the segments of the range have a row, which is updated when it is
+    split. Finished attempts are kept in a ring, and the rolling stats are
+    updated when an attempt enters or leaves it. New golds are written to
+    ``pb.yml`` every :attr:`SAVE_EVERY` attempts, and when leaving.
+    """
+    # Number of attempts in the rolling stats
+    ATTEMPTS = 20
+    SAVE_EVERY = 5
+
+    def __init__(self):
+        super().__init__()
+        self.pb = None
+        self.segments = []
+
+        # Durations of the segments of the current attempt
+        self.splits = []
+        self.segment_start = 0
+
+        # Total durations of the last finished attempts, and their sum.
+        self.attempts = collections.deque(maxlen=self.ATTEMPTS)
+        self.attempts_sum = 0
+        self.count = 0
+        self.best = None
+        # Last duration and gold of each segment of the range
+        self.last = []
+        self.golds = []
+        # Indexes of the segments with a gold not saved yet
+        self.pending = set()
+
+    def get_range(self, spec):
+        """
+        Segments of the route selected by ``FIRST[:LAST]``, where segments are
+        given by their id or position in the route.
+        """
+        def get_index(s):
+            if s in self.route.index:
+                return self.route.index[s]
+            if s.isdigit() and 1 <= int(s) <= len(self.route.route):
+                return int(s) - 1
+            raise ValueError(f'no segment {s} in the route {self.route.path}')
+
+        first, _, last = spec.partition(':')
+        first = get_index(first)
+        last = get_index(last) if last else first
+        if last < first:
+            raise ValueError(f'segment {spec} is an empty range')
+
+        return self.route.route[first:last + 1]
+
+    def main(self, run_dir, spec):
+        self.pb = Run.load(Path(run_dir) / 'pb.yml')
+        self.route = self.pb.get_route()
+        try:
+            self.segments = self.get_range(spec)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+
+        self.last = [None] * len(self.segments)
+        self.golds = [self.pb.segs.get(seg['id'], {}).get('gold') for seg in self.segments]
+
+        self.view = PracticeWindow(self.route, self.segments)
+        for idx in range(len(self.segments)):
+            self.update_segment(idx)
+        self.update_stats()
+        try:
+            self.run()
+        finally:
+            self.save_golds()
+        return 0
+
+    def get_color(self):
+        gold = self.golds[len(self.splits)]
+        return 'header red' if gold is not None and self.progress - self.segment_start > gold else 'header green'
+
+    def update_segment(self, idx):
+        name, last, gold = self.view.segment_rows[idx]
+        current = self.started and idx == len(self.splits)
+        name.set_text(('hilight' if current else 'normal', self.segments[idx]['name']))
+        last.set_text(get_timer_display(self.last[idx], 'gold' if self.last[idx] is not None and self.last[idx] == self.golds[idx] else 'normal'))
+        gold.set_text(get_timer_display(self.golds[idx], 'fixed gold'))
+
+    def update_stats(self):
+        golds = None if None in self.golds else sum(self.golds)
+        text = [
+            'Attempts: ', ('hilight', str(self.count)), '\n',
+            'Last: ', get_timer_display(self.attempts[-1] if self.attempts else None), '\n',
+            'Best: ', get_timer_display(self.best, 'gold'), '\n',
+            f'Average of the last {len(self.attempts)}: ',
+            get_timer_display(self.attempts_sum // len(self.attempts) if self.attempts else None), '\n',
+            'Sum of golds: ', get_timer_display(golds, 'fixed gold'),
+        ]
+        self.view.stats.set_text(text)
+
+    def start(self):
+        self.splits = []
+        self.progress = 0
+        self.segment_start = 0
+        self.started = True
+        self.paused = False
+        self.update_segment(0)
+
+    def reset(self):
+        """
+        Abandon the current attempt, it is not counted in the stats.
+        """
+        idx = len(self.splits)
+        self.started = False
+        self.paused = True
+        self.splits = []
+        self.progress = 0
+        if idx < len(self.segments):
+            self.update_segment(idx)
+
+    def split(self):
+        if not self.started:
+            self.start()
+            return
+        if self.paused:
+            return
+
+        idx = len(self.splits)
+        duration = self.progress - self.segment_start
+        self.splits.append(duration)
+        self.segment_start = self.progress
+        self.last[idx] = duration
+        if self.golds[idx] is None or duration < self.golds[idx]:
+            self.golds[idx] = duration
+            self.pending.add(idx)
+        self.update_segment(idx)
+
+        if len(self.splits) < len(self.segments):
+            self.update_segment(idx + 1)
+            return
+
+        self.finish()
+
+    def finish(self):
+        if len(self.attempts) == self.attempts.maxlen:
+            self.attempts_sum -= self.attempts[0]
+        self.attempts.append(self.progress)
+        self.attempts_sum += self.progress
+        self.count += 1
+        if self.best is None or self.progress < self.best:
+            self.best = self.progress
+        self.started = False
+        self.paused = True
+
+        self.update_stats()
+        if self.count % self.SAVE_EVERY == 0:
+            self.save_golds()
+
+    def save_golds(self):
+        if not self.pending:
+            return
+
+        for idx in self.pending:
+            seg = self.pb.segs.setdefault(self.segments[idx]['id'], {'pb': None, 'duration': None, 'gold': None})
+            seg['gold'] = self.golds[idx]
+        self.pb.updated = datetime.now()
+        self.pb.save()
+        self.view.message(f'{len(self.pending)} golds saved in {self.pb.path}')
+        self.pending.clear()
+
+    def handle_key(self, k):
+        if k == 'enter':
+            self.split()
+        elif k == 'g':
+            self.save_golds()
+
+
 if __name__ == '__main__':
     try:
         sys.exit(Spliter().main())
+    except ValidationError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
     except KeyboardInterrupt:
         sys.exit(0)
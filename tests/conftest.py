@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from offsplit import Run, Spliter  # noqa: E402
+
+
+@pytest.fixture
+def spliter(tmp_path, monkeypatch):
+    """
+    Splitter on the example run, as ``offsplit.py`` sets it up but without
+    starting the UI.
+    """
+    monkeypatch.chdir(ROOT)
+    spliter = Spliter()
+    spliter.pb = Run.load(ROOT / 'runs' / 'romain' / 'any' / 'pb.yml')
+    spliter.route = spliter.pb.get_route()
+    spliter.run = Run.from_pb(tmp_path / 'run.yml', spliter.pb)
+    for segment in spliter.run.iter_segments():
+        spliter.segments.append(segment)
+        spliter.view.add_segment(segment)
+    spliter.update()
+    return spliter
+
+
+def tick(spliter, count=1):
+    """
+    Run the timer for *count* ticks, as :meth:`Spliter.tick` does.
+    """
+    for _ in range(count):
+        spliter.advance(spliter.TICK)
+        spliter.update()
@@ -0,0 +1,107 @@
+import json
+import socket
+import time
+
+import pytest
+
+from conftest import tick
+from offsplit import Broadcaster
+
+STATE_KEYS = {
+    'route', 'timer', 'clock', 'times', 'paused', 'loading', 'segment', 'comparison', 'deltas',
+    'sob', 'bpt', 'pb', 'prediction',
+}
+
+
+def request(port, path):
+    client = socket.create_connection(('localhost', port), timeout=2)
+    client.sendall(b'GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n' % path.encode())
+    return client
+
+
+def read_events(client, duration):
+    """
+    Read the server-sent events received during *duration* seconds.
+    """
+    data = b''
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        client.settimeout(max(deadline - time.monotonic(), 0.01))
+        try:
+            chunk = client.recv(65536)
+        except socket.timeout:
+            break
+        if not chunk:
+            break
+        data += chunk
+
+    _, _, body = data.partition(b'\r\n\r\n')
+    return [json.loads(event[len(b'data: '):]) for event in body.split(b'\n\n') if event]
+
+
+@pytest.fixture
+def broadcaster():
+    broadcaster = Broadcaster('localhost', 0, rate=10)
+    broadcaster.start()
+    yield broadcaster
+    broadcaster.stop()
+
+
+def test_port_in_use(broadcaster):
+    with pytest.raises(OSError):
+        Broadcaster('localhost', broadcaster.port).start()
+
+
+def test_stop_after_loop_ended(broadcaster):
+    broadcaster.stop()
+    assert not broadcaster.thread.is_alive()
+    broadcaster.stop()
+
+
+def test_rate(broadcaster):
+    client = request(broadcaster.port, '/events')
+    time.sleep(0.1)
+
+    start = time.monotonic()
+    for i in range(100):
+        broadcaster.publish({'timer': i})
+        time.sleep(0.01)
+    events = read_events(client, 0.3)
+    elapsed = time.monotonic() - start
+
+    assert 1 < len(events) <= elapsed * 10 + 1
+    assert events[-1] == {'timer': 99}
+
+
+def test_schema(broadcaster, spliter):
+    spliter.broadcaster = broadcaster
+    spliter.update()
+    time.sleep(0.2)
+    client = request(broadcaster.port, '/events')
+
+    spliter.split()
+    tick(spliter, 20)
+    time.sleep(0.2)
+    spliter.split()
+    tick(spliter, 5)
+    events = read_events(client, 0.3)
+
+    state = events[0]
+    assert set(state) == STATE_KEYS
+    assert set(state['times']) == {'real', 'game'}
+    assert set(state['deltas']) == set(spliter.comparisons)
+    assert state['comparison'] in spliter.comparisons
+    for diff in events[1:]:
+        assert diff and set(diff) <= STATE_KEYS
+
+    state = {key: value for event in events for key, value in event.items()}
+    assert state['segment'] == spliter.current_segment.name
+    assert state['timer'] == spliter.progress
+    assert isinstance(state['deltas'][spliter.comparisons[0]], int)
+
+    with request(broadcaster.port, '/state') as client:
+        client.settimeout(2)
+        data = b''
+        while chunk := client.recv(65536):
+            data += chunk
+    assert json.loads(data.partition(b'\r\n\r\n')[2]) == state
@@ -0,0 +1,92 @@
+import pytest
+
+from conftest import tick
+
+
+@pytest.mark.parametrize('clock', ['real', 'game'])
+def test_split_delay_while_loading(spliter, clock):
+    spliter.clock = clock
+    spliter.split()
+    tick(spliter, 20)
+    spliter.toggle_loading()
+    tick(spliter, 10)
+
+    spliter.split(delay=500)
+    assert spliter.get_seg_durations(spliter.segments[0]) == {'real': 2500, 'game': 2000}
+    assert spliter.segments[1].loading_duration == 500
+
+    tick(spliter, 10)
+    spliter.toggle_loading()
+    tick(spliter, 10)
+    spliter.split()
+    assert spliter.get_seg_durations(spliter.segments[1]) == {'real': 2500, 'game': 1000}
+
+
+@pytest.mark.parametrize('clock', ['real', 'game'])
+def test_split_delay_since_loading(spliter, clock):
+    spliter.clock = clock
+    spliter.split()
+    tick(spliter, 20)
+    spliter.toggle_loading()
+    tick(spliter, 3)
+
+    # The command was issued 200 ms before the loading screen.
+    spliter.split(delay=500)
+    assert spliter.get_seg_durations(spliter.segments[0]) == {'real': 1800, 'game': 1800}
+    assert spliter.segments[1].loading_duration == 300
+
+
+def test_split_delay(spliter):
+    spliter.clock = 'game'
+    spliter.split()
+    tick(spliter, 20)
+
+    spliter.split(delay=500)
+    assert spliter.get_seg_durations(spliter.segments[0]) == {'real': 1500, 'game': 1500}
+
+
+@pytest.mark.parametrize('clock', ['real', 'game'])
+def test_pause_delay_since_loading(spliter, clock):
+    spliter.clock = clock
+    spliter.split()
+    tick(spliter, 10)
+    spliter.toggle_loading()
+    tick(spliter, 3)
+
+    # The command was issued 200 ms before the loading screen.
+    spliter.pause(delay=500)
+    assert spliter.get_times() == {'real': 800, 'game': 800}
+    assert spliter.get_seg_durations(spliter.segments[0]) == {'real': 800, 'game': 800}
+
+
+@pytest.mark.parametrize('clock', ['real', 'game'])
+def test_pause_delay_while_loading(spliter, clock):
+    spliter.clock = clock
+    spliter.split()
+    tick(spliter, 10)
+    spliter.toggle_loading()
+    tick(spliter, 10)
+
+    spliter.pause(delay=500)
+    assert spliter.get_times() == {'real': 1500, 'game': 1000}
+    tick(spliter, 10)
+
+    # The command was issued 300 ms before the end of the pause.
+    spliter.pause(delay=300)
+    assert spliter.get_times() == {'real': 1800, 'game': 1000}
+    tick(spliter, 2)
+    assert spliter.get_times() == {'real': 2000, 'game': 1000}
+
+
+def test_tick(spliter):
+    spliter.split()
+    spliter.toggle_loading()
+    spliter.tick()
+    spliter.toggle_loading()
+    spliter.tick()
+    assert spliter.get_times() == {'real': 2 * spliter.TICK, 'game': spliter.TICK}
+    assert spliter.get_seg_durations(spliter.current_segment) == spliter.get_times()
+
+    spliter.pause()
+    spliter.tick()
+    assert spliter.progress == 2 * spliter.TICK
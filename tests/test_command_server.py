@@ -0,0 +1,141 @@
+import select
+import socket
+import time
+
+import pytest
+
+from conftest import tick
+from offsplit import CommandServer
+
+
+class Loop:
+    """
+    Event loop with the file watching API of urwid's main loop.
+    """
+
+    def __init__(self):
+        self.watches = {}
+
+    def watch_file(self, fd, callback):
+        self.watches[fd] = callback
+        return fd
+
+    def remove_watch_file(self, handle):
+        del self.watches[handle]
+
+    def poll(self, timeout=0.1):
+        ready, _, _ = select.select(list(self.watches), [], [], timeout)
+        for fd in ready:
+            if fd in self.watches:
+                self.watches[fd]()
+
+
+class Client:
+    """
+    Local client of the command server.
+    """
+
+    def __init__(self, path, loop):
+        self.loop = loop
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(str(path))
+        self.socket.setblocking(False)
+        self.buf = b''
+
+    def send(self, data):
+        self.socket.sendall(data)
+
+    def read(self, count=1):
+        replies = []
+        deadline = time.monotonic() + 2
+        while len(replies) < count and time.monotonic() < deadline:
+            self.loop.poll()
+            try:
+                data = self.socket.recv(4096)
+            except BlockingIOError:
+                continue
+            if not data:
+                break
+
+            *lines, self.buf = (self.buf + data).split(b'\n')
+            replies += [line.decode('utf-8') for line in lines]
+
+        return replies
+
+    def command(self, line):
+        self.send(line.encode('utf-8') + b'\n')
+        return self.read()[0]
+
+
+@pytest.fixture
+def loop():
+    return Loop()
+
+
+@pytest.fixture
+def commands():
+    return []
+
+
+@pytest.fixture
+def server(tmp_path, loop, commands):
+    server = CommandServer(tmp_path / 'offsplit.sock', loop, lambda command, timestamp: commands.append((command, timestamp)))
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def client(server, loop):
+    client = Client(server.path, loop)
+    loop.poll()
+    return client
+
+
+def test_commands(client, commands):
+    timestamp = time.time()
+    assert client.command('split') == 'ok'
+    assert client.command(f'PAUSE {timestamp}') == 'ok'
+    assert commands == [('split', None), ('pause', timestamp)]
+
+
+def test_batch(client, commands):
+    client.send(b'split\n\nloading\nundo')
+    assert client.read() == ['ok', 'ok']
+    client.send(b'\n')
+    assert client.read() == ['ok']
+    assert [command for command, _ in commands] == ['split', 'loading', 'undo']
+
+
+@pytest.mark.parametrize('line, error', [
+    ('jump', "error: unknown command 'jump'"),
+    ('split now', "error: invalid timestamp 'now'"),
+    ('split nan', "error: invalid timestamp 'nan'"),
+    ('split inf', "error: invalid timestamp 'inf'"),
+    ('split 1697000000.123', "error: timestamp '1697000000.123' is more than 5s old"),
+])
+def test_errors(client, commands, line, error):
+    assert client.command(line) == error
+    assert not commands
+
+
+def test_line_too_long(client, server, loop):
+    client.send(b'x' * (CommandServer.MAX_LINE + 1))
+    assert client.read() == []
+    assert not server.clients
+
+
+def test_delay(tmp_path, loop, spliter):
+    server = CommandServer(tmp_path / 'offsplit.sock', loop, spliter.remote_command)
+    try:
+        client = Client(server.path, loop)
+        spliter.split()
+        tick(spliter, 50)
+
+        assert client.command(f'split {time.time() - 1}') == 'ok'
+        assert 3900 <= spliter.segments[0].duration <= 4100
+
+        tick(spliter, 50)
+        assert client.command(f'split {time.time() - 60}').startswith('error: ')
+        assert spliter.current_segment_idx == 1
+    finally:
+        server.close()
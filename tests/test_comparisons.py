@@ -0,0 +1,36 @@
+from conftest import ROOT, tick
+from offsplit import Comparison, Run, Segment, get_time_str
+
+RUN_PATH = ROOT / 'runs' / 'romain' / 'any' / 'run10.yml'
+
+
+def test_switch_comparison(spliter, monkeypatch):
+    run = Run.load(RUN_PATH)
+    spliter.add_comparison(Comparison.from_run('run10', run))
+    spliter.split()
+    tick(spliter, 20)
+    spliter.split()
+    tick(spliter, 5)
+    spliter.view.render((120, 40))
+
+    updated = []
+    update = Segment.update
+    monkeypatch.setattr(Segment, 'update', lambda self, current=True: (updated.append(self), update(self, current)))
+    spliter.switch_comparison()
+    spliter.update()
+    assert set(updated) == {spliter.current_segment}
+
+    # Only the rows on the screen are updated.
+    spliter.view.render((120, 40))
+    assert 1 < len(set(updated)) < len(spliter.segments) // 2
+
+    last = spliter.segments[-1]
+    assert last.stale
+    last.render((120,))
+    assert not last.stale
+    assert last.duration_widget.text == get_time_str(run.segs[last.id]['duration'])
+
+    assert spliter.comparison_totals == [
+        sum(seg['duration'] for seg in spliter.pb.segs.values()),
+        sum(seg['duration'] for seg in run.segs.values()),
+    ]
@@ -0,0 +1,27 @@
+from offsplit import History
+
+
+def test_resets():
+    history = History(['a', 'b', 'c'])
+    history.add([1000, 2000, 3000])
+    history.add([1100, None, None])
+    history.add([1200, 2200, None])
+    history.finish()
+
+    assert history.runs == 3
+    assert list(history.resets) == [0, 1, 1]
+    assert history.reset_rates == [0, 1 / 3, 1 / 2]
+    assert history.averages == [1100, 2100, 3000]
+    assert history.last == [1200, 2200, None]
+
+
+def test_unstarted_runs():
+    history = History(['a', 'b'])
+    history.add([1000, 2000])
+    history.add([None, None])
+    history.finish()
+
+    assert history.runs == 1
+    assert list(history.resets) == [0, 0]
+    assert history.reset_rates == [0, 0]
+    assert history.last == [1000, 2000]
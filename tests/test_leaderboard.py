@@ -0,0 +1,96 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from leaderboard import Run, SearchIndex, parse_date_range, parse_duration
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1:23:45', 5025000),
+    ('83:45', 5025000),
+    ('1h23m45s', 5025000),
+    ('1h30m', 5400000),
+    ('1h', 3600000),
+    ('90m', 5400000),
+    ('30s', 30000),
+    ('45s', 45000),
+    ('2m5s', 125000),
+    ('90', 5400000),
+])
+def test_parse_duration(text, expected):
+    assert parse_duration(text) == expected
+
+
+@pytest.mark.parametrize('text', ['', 'h', '1x', '1:x', '1s2m', '1m2'])
+def test_parse_duration_invalid(text):
+    with pytest.raises(ValueError):
+        parse_duration(text)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('2023', (datetime(2023, 1, 1), datetime(2024, 1, 1))),
+    ('2023-12', (datetime(2023, 12, 1), datetime(2024, 1, 1))),
+    ('2023-02', (datetime(2023, 2, 1), datetime(2023, 3, 1))),
+    ('2023-12-31', (datetime(2023, 12, 31), datetime(2024, 1, 1))),
+    ('2023..2024-06', (datetime(2023, 1, 1), datetime(2024, 7, 1))),
+    ('2023-05..', (datetime(2023, 5, 1), None)),
+    ('..2023', (None, datetime(2024, 1, 1))),
+])
+def test_parse_date_range(text, expected):
+    assert parse_date_range(text) == expected
+
+
+RUNS = [
+    ('alice', 'fast_run', 1800000, datetime(2023, 5, 2)),
+    ('bob', 'any-glitchless', 2400000, datetime(2022, 12, 31)),
+    ('alice', 'practice', 3000000, datetime(2024, 1, 15)),
+    ('carol', 'ALICE tribute', 3600000, datetime(2023, 11, 5)),
+    ('bobby', 'run2', 5400000, datetime(2023, 5, 30)),
+]
+
+
+@pytest.fixture
+def index():
+    return SearchIndex([
+        Run(Path('runs') / who / 'any' / f'{name}.yml', {'updated': updated, 'duration': duration})
+        for who, name, duration, updated in RUNS
+    ])
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('', [0, 1, 2, 3, 4]),
+    ('al', [0, 2, 3]),
+    ('alice', [0, 2, 3]),
+    ('player:alice', [0, 2]),
+    ('name:alice', [3]),
+    ('bob', [1, 4]),
+    ('BOBBY', [4]),
+    ('glitch', [1]),
+    ('any-gl', [1]),
+    ('run', [0, 4]),
+    ('<45m', [0, 1]),
+    ('<50m', [0, 1]),
+    ('<50m1s', [0, 1, 2]),
+    ('>50m', [3, 4]),
+    ('<30m1s', [0]),
+    ('>1h', [4]),
+    ('<1h30m', [0, 1, 2, 3]),
+    ('<45s', []),
+    ('>30s', [0, 1, 2, 3, 4]),
+    ('2023', [0, 3, 4]),
+    ('2023-05', [0, 4]),
+    ('2023-05-02', [0]),
+    ('2023-06..', [2, 3]),
+    ('..2022', [1]),
+    ('alice 2023 <1h', [0]),
+    ('zed', []),
+])
+def test_search(index, query, expected):
+    assert list(index.search(query)) == expected
+
+
+@pytest.mark.parametrize('query', ['<abc', 'who:alice', '>1:x'])
+def test_search_invalid(index, query):
+    with pytest.raises(ValueError):
+        index.search(query)
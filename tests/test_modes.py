@@ -0,0 +1,91 @@
+import shutil
+
+import pytest
+
+from conftest import ROOT
+from offsplit import Practice, Race, Run, TimerApp
+
+
+class Loop:
+    def set_alarm_in(self, seconds, callback):
+        pass
+
+
+@pytest.fixture
+def run_dirs(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    # The main loop is not started, ticks are run by hand.
+    monkeypatch.setattr(TimerApp, 'run', lambda self: setattr(self, 'loop', Loop()))
+    run_dirs = []
+    for name in ('alice', 'bob'):
+        run_dir = tmp_path / 'runs' / name / 'any'
+        run_dir.mkdir(parents=True)
+        shutil.copy(ROOT / 'runs' / 'romain' / 'any' / 'pb.yml', run_dir)
+        run_dirs.append(run_dir)
+    return run_dirs
+
+
+def press(app, *keys):
+    for k in keys:
+        app.unhandled_input(k)
+
+
+def tick(app, count):
+    for _ in range(count):
+        app.tick()
+
+
+def test_race(run_dirs):
+    race = Race()
+    assert race.main(run_dirs) == 0
+    alice, bob = race.runners
+
+    press(race, 'enter')
+    tick(race, 10)
+    press(race, '2')
+    tick(race, 5)
+    press(race, '1', 'enter')
+    assert alice.splits == [1500]
+    assert bob.splits == [1000]
+    assert race.leader is bob
+    assert race.view.header.attr_map == {None: 'header green'}
+
+    press(race, ' ')
+    tick(race, 5)
+    press(race, '1')
+    assert race.view.header.attr_map == {None: 'header paused'}
+    assert alice.splits == [1500]
+
+    press(race, ' ', 's')
+    assert len(list(run_dirs[0].glob('race-*.yml'))) == 1
+
+    press(race, 'r')
+    assert race.progress == 0
+    assert not alice.splits and not race.started
+
+
+def test_practice(run_dirs):
+    practice = Practice()
+    assert practice.main(run_dirs[0], '1:2') == 0
+    gold = practice.golds[0]
+
+    press(practice, 'enter')
+    tick(practice, 10)
+    press(practice, 'enter')
+    assert practice.view.header.attr_map == {None: 'header green'}
+    tick(practice, 20)
+    press(practice, 'enter')
+    assert practice.splits == [1000, 2000]
+    assert practice.attempts[-1] == 3000
+    assert practice.golds[0] == 1000 < gold
+    assert not practice.started
+
+    press(practice, 'g')
+    assert Run.load(run_dirs[0] / 'pb.yml').segs[practice.segments[0]['id']]['gold'] == 1000
+
+    press(practice, 'enter', ' ')
+    tick(practice, 5)
+    assert practice.view.header.attr_map == {None: 'header paused'}
+    assert practice.progress == 0
+    press(practice, 'r')
+    assert practice.count == 1
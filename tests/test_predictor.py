@@ -0,0 +1,51 @@
+from conftest import ROOT
+from offsplit import History, Predictor, Run
+
+RUN_DIR = ROOT / 'runs' / 'romain' / 'any'
+
+
+def backtest(run_dir):
+    """
+    Predict the final time of each finished run, at each of its splits, from
+    the previous runs only.
+
+    :return: number of predictions, and how many had the final time in their
+             p10-p90 range
+    """
+    pb = Run.load(run_dir / 'pb.yml')
+    ids = [seg['id'] for seg in pb.get_route().route]
+    runs = sorted((run for run in Run.iter_runs(run_dir, archived=True) if run.name != 'pb'), key=lambda run: run.updated)
+
+    predictions = hits = 0
+    for idx, run in enumerate(runs):
+        durations = [run.segs.get(id, {}).get('duration') for id in ids]
+        if None in durations or not idx:
+            continue
+
+        history = History.load(ids, runs[:idx])
+        predictor = Predictor.from_history([(id, pb.segs.get(id, {}).get('duration')) for id in ids], history)
+        final = sum(durations)
+        progress = 0
+        for seg_idx, duration in enumerate(durations):
+            _, low, high = predictor.predict(seg_idx, progress)
+            predictions += 1
+            hits += low <= final <= high
+            progress += duration
+
+    return predictions, hits
+
+
+def test_backtest():
+    predictions, hits = backtest(RUN_DIR)
+    assert predictions
+    # About 65% when the last 5 attempts of each segment are used.
+    assert 0.6 <= hits / predictions <= 0.9
+
+
+def test_predict_finished_segments():
+    predictor = Predictor([('a', 1000), ('b', None)], {'b': [2000, 4000]})
+    assert predictor.predict(2, 5000) == (5000, 5000, 5000)
+    expected, low, high = predictor.predict(1, 1000)
+    assert (low, high) == (3000, 5000)
+    assert 3900 <= expected <= 4100
+    assert predictor.predict(0, 0)[1:] == (3000, 5000)
@@ -0,0 +1,56 @@
+import collections
+
+from conftest import tick
+from offsplit import MarkupText
+
+
+def count_invalidations(monkeypatch, spliter):
+    """
+    Count the invalidations of the MarkupText widgets of each segment row.
+    """
+    rows = {}
+    for idx, segment in enumerate(spliter.segments):
+        for widget in vars(segment).values():
+            if isinstance(widget, MarkupText):
+                rows[id(widget)] = idx
+
+    counts = collections.Counter()
+    invalidate = MarkupText._invalidate
+
+    def _invalidate(self):
+        if id(self) in rows:
+            counts[rows[id(self)]] += 1
+        invalidate(self)
+
+    monkeypatch.setattr(MarkupText, '_invalidate', _invalidate)
+    return counts
+
+
+def test_one_row_per_tick(monkeypatch, spliter):
+    spliter.split()
+    tick(spliter, 30)
+    spliter.split()
+
+    counts = count_invalidations(monkeypatch, spliter)
+    rendered = []
+    for _ in range(800):
+        counts.clear()
+        tick(spliter)
+        assert list(counts) in ([], [spliter.current_segment_idx])
+        rendered.append(bool(counts))
+
+    # Tenths of seconds are displayed during the first minute of the segment,
+    # then only seconds.
+    assert all(rendered[:590])
+    assert 10 <= sum(rendered[-100:]) <= 20
+
+
+def test_paused(monkeypatch, spliter):
+    spliter.split()
+    tick(spliter, 30)
+    spliter.pause()
+    tick(spliter)
+
+    counts = count_invalidations(monkeypatch, spliter)
+    tick(spliter, 50)
+    assert not counts
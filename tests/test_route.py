@@ -0,0 +1,63 @@
+import marshal
+import pickle
+import shutil
+
+import pytest
+
+from conftest import ROOT
+from offsplit import Route
+
+
+@pytest.fixture
+def route_path(tmp_path):
+    path = tmp_path / 'any.yml'
+    shutil.copy(ROOT / 'routes' / 'eldenring' / 'route.any.glitchless.bhf.yml', path)
+    return path
+
+
+def test_bundle(route_path):
+    route = Route.load(route_path)
+    route.save_bundle()
+    bundled = Route.load(route_path)
+    assert bundled == route
+    assert bundled.markup == route.markup
+    assert bundled.index == route.index
+
+
+def test_stale_bundle(route_path):
+    Route.load(route_path).save_bundle()
+    with open(route_path, 'a', encoding='utf-8') as fp:
+        fp.write('# edited\n')
+
+    route = Route.load(route_path)
+    assert route.hash != marshal.loads(route.bundle_path.read_bytes())['route']['hash']
+
+
+class Payload:
+    def __reduce__(self):
+        return (exec, ('raise SystemExit("pickle bundles must not be loaded")',))
+
+
+@pytest.mark.parametrize('content', [
+    b'',
+    b'garbage',
+    marshal.dumps(None),
+    marshal.dumps([]),
+    marshal.dumps({'version': Route.BUNDLE_VERSION}),
+    marshal.dumps({'version': Route.BUNDLE_VERSION, 'route': None}),
+    marshal.dumps({'version': Route.BUNDLE_VERSION, 'route': {'hash': None}}),
+    pickle.dumps({'version': Route.BUNDLE_VERSION, 'route': Payload()}),
+], ids=['empty', 'garbage', 'none', 'list', 'no route', 'null route', 'stale route', 'pickle'])
+def test_invalid_bundle(route_path, content):
+    expected = Route.load(route_path)
+    route_path.with_suffix('.bundle').write_bytes(content)
+    assert Route.load(route_path) == expected
+
+
+def test_bundle_with_unknown_fields(route_path):
+    route = Route.load(route_path)
+    route.save_bundle()
+    bundle = marshal.loads(route.bundle_path.read_bytes())
+    bundle['route']['unknown'] = True
+    route.bundle_path.write_bytes(marshal.dumps(bundle))
+    assert Route.load(route_path) == route
@@ -0,0 +1,166 @@
+import subprocess
+
+import pytest
+
+from leaderboard import RunIndex, sync
+
+RUN = '''\
+route: routes/any.yml
+created: 2023-07-04 00:24:46
+updated: 2023-07-04 01:24:46
+version: 2
+segs:
+  a: {{duration: {duration}, pb: null, gold: null}}
+'''
+
+
+def git(cwd, *args):
+    subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True)
+
+
+def write_run(path, duration):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(RUN.format(duration=duration), encoding='utf-8')
+
+
+def commit(cwd, message='runs'):
+    git(cwd, 'add', '-A')
+    git(cwd, 'commit', '-q', '-m', message)
+
+
+@pytest.fixture(autouse=True)
+def git_env(monkeypatch):
+    for key in ('AUTHOR', 'COMMITTER'):
+        monkeypatch.setenv(f'GIT_{key}_NAME', 'Runner')
+        monkeypatch.setenv(f'GIT_{key}_EMAIL', 'runner@example.com')
+    monkeypatch.setenv('GIT_CONFIG_GLOBAL', '/dev/null')
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """
+    Bare repository shared by the players, and the clone of another player.
+    """
+    remote = tmp_path / 'runs.git'
+    git(tmp_path, 'init', '-q', '--bare', '-b', 'master', str(remote))
+    other = tmp_path / 'alice'
+    git(tmp_path, 'clone', '-q', str(remote), str(other))
+    write_run(other / 'runs' / 'alice' / 'any' / 'run1.yml', 1000)
+    commit(other)
+    git(other, 'push', '-q', 'origin', 'master')
+    return remote
+
+
+@pytest.fixture
+def checkout(tmp_path, remote, monkeypatch):
+    checkout = tmp_path / 'bob'
+    git(tmp_path, 'clone', '-q', str(remote), str(checkout))
+    monkeypatch.chdir(checkout)
+    return checkout
+
+
+def push(tmp_path, change):
+    """
+    Apply a change in the clone of the other player, and push it.
+    """
+    other = tmp_path / 'alice'
+    change(other)
+    commit(other)
+    git(other, 'push', '-q', 'origin', 'master')
+
+
+def test_update(tmp_path, checkout, monkeypatch):
+    index = RunIndex()
+    index.update()
+    assert index.runs['runs/alice/any/run1.yml']['duration'] == 1000
+    head = index.commit
+
+    # Only the changes of the diff are read after the first scan.
+    monkeypatch.setattr(index, 'scan', lambda: pytest.fail('full scan'))
+    push(tmp_path, lambda other: write_run(other / 'runs' / 'alice' / 'any' / 'run2.yml', 2000))
+    push(tmp_path, lambda other: write_run(other / 'runs' / 'alice' / 'any' / 'run1.yml', 1500))
+    sync(str(tmp_path / 'runs.git'))
+    index.update()
+    assert index.commit != head
+    assert {path: run['duration'] for path, run in index.runs.items()} == {
+        'runs/alice/any/run1.yml': 1500,
+        'runs/alice/any/run2.yml': 2000,
+    }
+
+    push(tmp_path, lambda other: (other / 'runs' / 'alice' / 'any' / 'run1.yml').unlink())
+    sync(str(tmp_path / 'runs.git'))
+    index.update()
+    assert list(index.runs) == ['runs/alice/any/run2.yml']
+
+
+def test_dirty(checkout):
+    index = RunIndex()
+    index.update()
+
+    write_run(checkout / 'runs' / 'bob' / 'any' / 'run1.yml', 3000)
+    write_run(checkout / 'runs' / 'alice' / 'any' / 'run1.yml', 500)
+    index.update()
+    assert index.dirty == {'runs/bob/any/run1.yml', 'runs/alice/any/run1.yml'}
+    assert index.runs['runs/bob/any/run1.yml']['duration'] == 3000
+    assert index.runs['runs/alice/any/run1.yml']['duration'] == 500
+
+    # Reverted files are read again.
+    git(checkout, 'checkout', '--', 'runs')
+    (checkout / 'runs' / 'bob' / 'any' / 'run1.yml').unlink()
+    index.update()
+    assert index.dirty == set()
+    assert {path: run['duration'] for path, run in index.runs.items()} == {'runs/alice/any/run1.yml': 1000}
+
+
+def test_saved_index(tmp_path, checkout):
+    index = RunIndex()
+    index.update()
+    index.save()
+
+    push(tmp_path, lambda other: write_run(other / 'runs' / 'alice' / 'any' / 'run2.yml', 2000))
+    sync(str(tmp_path / 'runs.git'))
+    index = RunIndex.load()
+    index.update()
+    assert sorted(index.runs) == ['runs/alice/any/run1.yml', 'runs/alice/any/run2.yml']
+
+
+def test_subdirectory(tmp_path, remote, monkeypatch):
+    # The runs are in a subdirectory of the repository.
+    checkout = tmp_path / 'bob'
+    git(tmp_path, 'clone', '-q', str(remote), str(checkout))
+    (checkout / 'offsplit').mkdir()
+    git(checkout, 'mv', 'runs', 'offsplit/runs')
+    commit(checkout)
+    monkeypatch.chdir(checkout / 'offsplit')
+
+    index = RunIndex()
+    index.update()
+    head = index.commit
+    write_run(checkout / 'offsplit' / 'runs' / 'bob' / 'any' / 'run1.yml', 3000)
+    commit(checkout)
+    write_run(checkout / 'offsplit' / 'runs' / 'bob' / 'any' / 'run2.yml', 4000)
+    index.update()
+
+    assert index.commit != head
+    assert sorted(index.runs) == ['runs/alice/any/run1.yml', 'runs/bob/any/run1.yml', 'runs/bob/any/run2.yml']
+    assert index.dirty == {'runs/bob/any/run2.yml'}
+
+
+def test_sync_diverged(tmp_path, checkout):
+    write_run(checkout / 'runs' / 'bob' / 'any' / 'run1.yml', 3000)
+    commit(checkout)
+    push(tmp_path, lambda other: write_run(other / 'runs' / 'alice' / 'any' / 'run2.yml', 2000))
+
+    with pytest.raises(RuntimeError, match='diverged'):
+        sync(str(tmp_path / 'runs.git'))
+
+
+def test_no_repository(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('GIT_CEILING_DIRECTORIES', str(tmp_path))
+    write_run(tmp_path / 'runs' / 'alice' / 'any' / 'run1.yml', 1000)
+
+    index = RunIndex()
+    index.update()
+    assert index.commit is None
+    assert list(index.runs) == ['runs/alice/any/run1.yml']
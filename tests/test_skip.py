@@ -0,0 +1,26 @@
+from conftest import tick
+
+
+def test_no_gold_after_skip(spliter):
+    spliter.segments[1].gold = None
+    gold = spliter.segments[0].gold
+
+    spliter.split()
+    tick(spliter, 30)
+    spliter.skip()
+    tick(spliter, 50)
+    spliter.split()
+    assert spliter.segments[1].duration == 8000
+    assert spliter.segments[1].after_skip
+
+    spliter.update()
+    assert 'gold' not in str(spliter.segments[1].duration_widget.get_text())
+
+    spliter.undo()
+    spliter.redo()
+    assert spliter.segments[1].after_skip
+
+    spliter.reset()
+    assert spliter.segments[0].gold == gold
+    assert spliter.segments[1].gold is None
+    assert not spliter.segments[1].after_skip
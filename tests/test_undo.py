@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from conftest import tick
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Fake time.monotonic(), advanced by hand.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_undo_split(spliter):
+    spliter.split()
+    tick(spliter, 20)
+    spliter.split()
+    tick(spliter, 5)
+
+    spliter.undo()
+    assert spliter.current_segment_idx == 0
+    assert spliter.current_segment.progress == spliter.progress == 2500
+    spliter.redo()
+    assert spliter.current_segment_idx == 1
+    assert spliter.segments[0].duration == 2000
+
+
+@pytest.mark.parametrize('clock_name, loading, times', [
+    ('real', False, {'real': 5000, 'game': 5000}),
+    ('game', False, {'real': 5000, 'game': 5000}),
+    ('real', True, {'real': 5000, 'game': 2000}),
+    ('game', True, {'real': 5000, 'game': 2000}),
+])
+def test_undo_reset(spliter, clock, clock_name, loading, times):
+    spliter.clock = clock_name
+    spliter.split()
+    tick(spliter, 20)
+    if loading:
+        spliter.toggle_loading()
+
+    spliter.reset()
+    assert spliter.paused
+    assert spliter.progress == 0
+
+    # The run went on during the 3 s between the reset and its undo.
+    clock[0] += 3
+    spliter.undo()
+    assert not spliter.paused
+    assert spliter.loading == loading
+    assert spliter.get_times() == times
+    assert spliter.get_seg_durations(spliter.current_segment) == times
+
+    spliter.redo()
+    assert spliter.paused
+    assert spliter.progress == 0
+
+
+def test_undo_reset_paused(spliter, clock):
+    spliter.split()
+    tick(spliter, 20)
+    spliter.pause()
+    spliter.reset()
+
+    clock[0] += 3
+    spliter.undo()
+    assert spliter.paused
+    assert spliter.progress == 2000
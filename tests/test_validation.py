@@ -0,0 +1,102 @@
+import shutil
+
+import pytest
+
+import leaderboard
+from conftest import ROOT
+from offsplit import History, Run, ValidationError
+
+ROUTE = 'routes/eldenring/route.any.glitchless.bhf.yml'
+
+VALID = f'''\
+route: {ROUTE}
+created: 2023-07-04 00:24:46
+updated: 2023-07-04 01:24:46
+version: 2
+segs:
+  a: {{duration: 1000, pb: null, gold: null}}
+'''
+
+MALFORMED = {
+    'no updated': VALID.replace('updated: 2023-07-04 01:24:46\n', ''),
+    'no created': VALID.replace('created: 2023-07-04 00:24:46\n', ''),
+    'null updated': VALID.replace('updated: 2023-07-04 01:24:46', 'updated: null'),
+    'string updated': VALID.replace('updated: 2023-07-04 01:24:46', 'updated: yesterday'),
+    'string created': VALID.replace('created: 2023-07-04 00:24:46', 'created: yesterday'),
+    'no route': VALID.replace(f'route: {ROUTE}\n', ''),
+    'unknown key': VALID + 'player: alice\n',
+    'negative duration': VALID.replace('duration: 1000', 'duration: -1'),
+    'missing gold': VALID.replace(', gold: null', ''),
+    'unsupported version': VALID.replace('version: 2', 'version: 3'),
+    'not yaml': 'route: [',
+}
+
+# The leaderboard does not need the route of legacy runs.
+LEGACY = '''\
+route: routes/missing.yml
+created: 2023-07-04 00:24:46
+updated: 2023-07-04 01:24:46
+run:
+- {duration: 1.5, pb: null, gold: null}
+'''
+
+
+@pytest.fixture
+def run_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    run_dir = tmp_path / 'runs' / 'alice' / 'any'
+    run_dir.mkdir(parents=True)
+    (run_dir / 'valid.yml').write_text(VALID, encoding='utf-8')
+    return run_dir
+
+
+def test_created_may_be_null(run_dir):
+    path = run_dir / 'pb.yml'
+    path.write_text(VALID.replace('created: 2023-07-04 00:24:46', 'created: null'), encoding='utf-8')
+    assert Run.load(path).created is None
+
+
+@pytest.mark.parametrize('name', MALFORMED)
+def test_malformed(run_dir, name):
+    path = run_dir / 'malformed.yml'
+    path.write_text(MALFORMED[name], encoding='utf-8')
+
+    with pytest.raises(ValidationError):
+        Run.load(path)
+    with pytest.raises(ValidationError):
+        leaderboard.read_run(path)
+
+
+def test_missing_legacy_route(run_dir):
+    path = run_dir / 'legacy.yml'
+    path.write_text(LEGACY, encoding='utf-8')
+
+    with pytest.raises(ValidationError, match='cannot read route'):
+        Run.load(path)
+    assert leaderboard.read_run(path)['duration'] == 1500
+
+
+def test_iter_runs(run_dir):
+    for name, content in MALFORMED.items():
+        (run_dir / f'{name}.yml').write_text(content, encoding='utf-8')
+    (run_dir / 'legacy.yml').write_text(LEGACY, encoding='utf-8')
+
+    errors = []
+    runs = list(Run.iter_runs(run_dir, errors=errors))
+    assert [run.name for run in runs] == ['valid']
+    assert len(errors) == len(MALFORMED) + 1
+
+    history = History.load(['a'], runs)
+    assert list(history.durations[0]) == [1000]
+
+
+def test_leaderboard_scan(run_dir, monkeypatch):
+    monkeypatch.chdir(run_dir.parent.parent.parent)
+    shutil.copytree(ROOT / 'routes', 'routes')
+    for name, content in MALFORMED.items():
+        (run_dir / f'{name}.yml').write_text(content, encoding='utf-8')
+
+    index = leaderboard.RunIndex()
+    index.scan()
+    assert list(index.runs) == ['runs/alice/any/valid.yml']
+    assert len(index.errors) == len(MALFORMED)